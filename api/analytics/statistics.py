@@ -0,0 +1,140 @@
+"""
+ANALYTICS OVER STORED DAY HISTORY (session_security_history).
+Close prices are loaded in matrix (dates x secids) and all metrics are calculated by numpy without row loops.
+Big requests are calculated in process pool (QUEUE_PROCESS), worker loads data by own DB pool.
+"""
+import warnings
+from datetime import date
+from functools import partial
+
+import numpy as np
+from asyncpg.pool import Pool
+from fastapi import APIRouter, HTTPException
+from numpy.lib.stride_tricks import sliding_window_view
+from pydantic import BaseModel, Field, root_validator, validator
+
+from api.history.day_aggregation import check_date_period, check_end_date
+from config import settings
+from db import MOEX_DB
+from workers import TaskModel, submit_process_task
+
+router_analytics = APIRouter()
+
+# One row by secid and date: board with max turnover
+SQL_CLOSE_PRICES = """
+    SELECT DISTINCT ON (secid, tradedate) secid, tradedate, close
+    FROM session_security_history
+    WHERE secid = any($1::varchar[])
+      AND tradedate between $2 AND $3
+      AND close IS NOT NULL
+    ORDER BY secid, tradedate, value DESC NULLS LAST
+"""
+
+
+class AnalyticsModel(BaseModel):
+    secids: list[str] = Field(min_items=1, max_items=settings.ANALYTICS_MAX_SECURITIES)
+    start_date: date
+    end_date: date
+    window: int = Field(default=20, ge=2, le=500, description="Window for rolling statistics (days)")
+    periods_per_year: int = Field(default=252, ge=1, description="For annualized volatility")
+
+    _check_date_period = root_validator(allow_reuse=True)(check_date_period)
+    _check_end_date = validator("end_date", allow_reuse=True)(check_end_date)
+
+    @validator("secids")
+    def unique_secids(cls, v):
+        return list(dict.fromkeys(v))
+
+
+def records_to_matrix(records, secids: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Return dates (datetime64[D]) and close matrix (dates x secids, NaN - no data)"""
+    if not records:
+        return np.array([], dtype="datetime64[D]"), np.empty((0, len(secids)))
+    secid_values, date_values, close_values = zip(*records)
+    dates, date_position = np.unique(np.array(date_values, dtype="datetime64[D]"), return_inverse=True)
+    secid_index = {secid: num for num, secid in enumerate(secids)}
+    secid_position = np.fromiter((secid_index[secid] for secid in secid_values), dtype=np.int64)
+    matrix = np.full((len(dates), len(secids)), np.nan)
+    matrix[date_position, secid_position] = np.array(close_values, dtype=np.float64)
+    return dates, matrix
+
+
+def rolling(values: np.ndarray, window: int, function) -> np.ndarray:
+    """Rolling statistic by axis 0, first (window - 1) values are NaN"""
+    result = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # WINDOWS WITHOUT DATA -> NaN
+            result[window - 1:] = function(sliding_window_view(values, window, axis=0), axis=-1)
+    return result
+
+
+def max_drawdown(matrix: np.ndarray) -> np.ndarray:
+    running_max = np.fmax.accumulate(matrix, axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmin(matrix / running_max - 1, axis=0)
+
+
+def correlation(returns: np.ndarray) -> np.ndarray:
+    """Pairwise correlation (only dates with both values)"""
+    masked = np.ma.masked_invalid(returns)
+    return np.ma.corrcoef(masked, rowvar=False, allow_masked=True).filled(np.nan)
+
+
+def to_json(values: np.ndarray) -> list:
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def calculate_metrics(
+        dates: np.ndarray,
+        matrix: np.ndarray,
+        secids: list[str],
+        window: int,
+        periods_per_year: int,
+) -> dict:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_returns = np.diff(np.log(matrix), axis=0)
+    volatility = rolling(log_returns, window, partial(np.nanstd, ddof=1)) * np.sqrt(periods_per_year)
+    drawdown = max_drawdown(matrix)
+    corr = correlation(log_returns) if len(log_returns) > 1 else np.full((len(secids), len(secids)), np.nan)
+    return {
+        "secids": secids,
+        "dates": dates.astype(str).tolist(),
+        "close": to_json(matrix),
+        "log_returns": to_json(log_returns),
+        "moving_average": to_json(rolling(matrix, window, np.nanmean)),
+        "volatility": to_json(volatility),
+        "max_drawdown": dict(zip(secids, to_json(drawdown))),
+        "correlation": to_json(np.atleast_2d(corr)),
+    }
+
+
+async def load_and_calculate(pool: Pool, secids: list[str], start_date: date, end_date: date, window: int,
+                             periods_per_year: int) -> dict:
+    async with pool.acquire() as connection:
+        records = await connection.fetch(SQL_CLOSE_PRICES, secids, start_date, end_date)
+    if not records:
+        return {}
+    dates, matrix = records_to_matrix(records, secids)
+    return calculate_metrics(dates, matrix, secids, window, periods_per_year)
+
+
+@router_analytics.post("/securities", description="Returns, volatility, moving average, drawdown, correlation",
+                       tags=["Analytics"])
+async def get_analytics(data: AnalyticsModel):
+    calculation = partial(
+        load_and_calculate,
+        secids=data.secids,
+        start_date=data.start_date,
+        end_date=data.end_date,
+        window=data.window,
+        periods_per_year=data.periods_per_year,
+    )
+    if len(data.secids) * (data.end_date - data.start_date).days >= settings.ANALYTICS_PROCESS_MIN_SIZE:
+        result = await submit_process_task(TaskModel(calculation, need_db=True))
+    else:
+        result = await calculation(pool=MOEX_DB.pool)
+    if result:
+        return result
+    raise HTTPException(status_code=404, detail="Data not found!")
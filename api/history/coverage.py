@@ -0,0 +1,84 @@
+"""
+IN-MEMORY COVERAGE OF DAY HISTORY by (secid, engine, market, session).
+Every key keeps sorted disjoint (merged) success intervals, search by bisect - O(log n).
+Coverage only grows (success intervals are never removed, only merged), so cache can't become wrong.
+Used as fast path: fully covered request doesn't need gap planning in DB.
+"""
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from config import settings
+from utils import singleton
+
+ONE_DAY = timedelta(days=1)
+
+
+@dataclass
+class CoverageStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class IntervalSet:
+    """Sorted disjoint closed date intervals. Adjacent intervals are merged"""
+    __slots__ = ("starts", "ends")
+
+    def __init__(self):
+        self.starts: list[date] = []
+        self.ends: list[date] = []
+
+    def add(self, start: date, end: date):
+        left = bisect_left(self.ends, start - ONE_DAY)  # FIRST INTERVAL THAT CAN BE MERGED
+        right = bisect_right(self.starts, end + ONE_DAY)
+        if left < right:
+            start = min(start, self.starts[left])
+            end = max(end, self.ends[right - 1])
+        self.starts[left:right] = [start]
+        self.ends[left:right] = [end]
+
+    def gaps(self, start: date, end: date) -> list[tuple[date, date]]:
+        result = []
+        position = bisect_left(self.ends, start)
+        current = start
+        while position < len(self.starts) and self.starts[position] <= end:
+            if self.starts[position] > current:
+                result.append((current, self.starts[position] - ONE_DAY))
+            current = max(current, self.ends[position] + ONE_DAY)
+            position += 1
+        if current <= end:
+            result.append((current, end))
+        return result
+
+
+@singleton
+class CoverageCache:
+    def __init__(self):
+        self._data: OrderedDict[tuple, IntervalSet] = OrderedDict()
+        self.stats = CoverageStats()
+
+    def add(self, key: tuple, start: date, end: date):
+        if (intervals := self._data.get(key)) is None:
+            intervals = self._data[key] = IntervalSet()
+            while len(self._data) > settings.COVERAGE_CACHE_MAX_KEYS:
+                self._data.popitem(last=False)
+        self._data.move_to_end(key)
+        intervals.add(start, end)
+
+    def is_covered(self, key: tuple, start: date, end: date) -> bool:
+        intervals = self._data.get(key)
+        if intervals is not None and not intervals.gaps(start, end):
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return True
+        self.stats.misses += 1
+        return False
+
+
+COVERAGE_CACHE = CoverageCache()
@@ -1,17 +1,67 @@
 import asyncio
+from collections import defaultdict
+from enum import Enum
+from math import ceil
+from typing import AsyncIterator, Iterable
 
 from asyncpg import PostgresError
-import aiohttp
 from loguru import logger
 from datetime import date, datetime, timedelta
 from db import MOEX_DB
+from moex_client import MOEX_CLIENT, MoexApiError
 from config import settings, REQUEST_SEMAPHORE
-from fastapi import APIRouter, HTTPException
-from pydantic import root_validator, validator
-from sql_requests.log_session_history import raw_sql_get_requests_to_api_history
+from asyncpg import Record
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, root_validator, validator
+from api.history.coverage import COVERAGE_CACHE
+from api.securities_info.summary import refresh_security_summary
+from api.history.trading_calendar import TRADING_CALENDAR
+from api.history.waiters import HISTORY_WAITERS, STATUS_ERROR, STATUS_SUCCESS
+from api.history.response_formats import (
+    STREAM_FORMATS,
+    HistoryFormat,
+    columnar_response,
+    negotiate_format,
+    streaming_response,
+)
+from sql_requests.log_session_history import (
+    raw_sql_get_requests_to_api_history,
+    raw_sql_get_requests_to_api_history_batch,
+    raw_sql_lock_history_key,
+    raw_sql_merge_success_history,
+)
+from utils.database.bulk import bulk_upsert
+from utils.http.fast_json import FastJSONResponse, json_dumps, parse_date
+from utils.metrics import ISS_REQUEST_SECONDS
 from utils.validators.secid_and_market import DefaultValidateDataModel, check_default_values
 
-router_security_history = APIRouter()
+router_security_history = APIRouter(default_response_class=FastJSONResponse)
+
+
+def check_date_period(cls, values):
+    end_date, start_date = values.get("end_date"),  values.get("start_date")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail=f"Last Date > First date")
+    if start_date < date(2015, 1, 1):
+        raise HTTPException(status_code=400, detail=f"Date can be more then 2014-12-31")
+    if (end_date - start_date).days >= 3000:
+        raise HTTPException(status_code=400, detail=f"Not more then 3000 days")
+    return values
+
+
+def check_end_date(cls, v):
+    if v >= (last_date := datetime.now().date() - timedelta(days=1)):
+        return last_date
+    return v
+
+
+class HistoryInterval(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+    quarter = "quarter"
+    year = "year"
 
 
 class SecurityDayHistoryModel(
@@ -21,23 +71,46 @@ class SecurityDayHistoryModel(
 ):
     start_date: date
     end_date: date
+    interval: HistoryInterval = HistoryInterval.day
+
+    _check_date_period = root_validator(allow_reuse=True)(check_date_period)
+    _check_end_date = validator("end_date", allow_reuse=True)(check_end_date)
+
+
+class SecurityHistoryKeyModel(
+    DefaultValidateDataModel,
+    use_required_fields={"engine", "market", "session", "secid"},
+    use_optional_fields={},
+):
+    pass
+
+
+class SecuritiesDayHistoryModel(BaseModel):
+    securities: list[SecurityHistoryKeyModel] = Field(min_items=1, max_items=settings.MAX_BATCH_SECURITIES)
+    start_date: date
+    end_date: date
+    interval: HistoryInterval = HistoryInterval.day
 
-    @root_validator
-    def check_date_period(cls, values):
-        end_date, start_date = values.get("end_date"),  values.get("start_date")
-        if end_date < start_date:
-            raise HTTPException(status_code=400, detail=f"Last Date > First date")
-        if start_date < date(2015, 1, 1):
-            raise HTTPException(status_code=400, detail=f"Date can be more then 2014-12-31")
-        if (end_date - start_date).days >= 3000:
-            raise HTTPException(status_code=400, detail=f"Not more then 3000 days")
-        return values
+    _check_date_period = root_validator(allow_reuse=True)(check_date_period)
+    _check_end_date = validator("end_date", allow_reuse=True)(check_end_date)
 
-    @validator("end_date")
-    def check_end_date(cls, v):
-        if v >= (last_date := datetime.now().date() - timedelta(days=1)):
-            return last_date
-        return v
+    def security_requests(self) -> list[SecurityDayHistoryModel]:
+        """Split batch into single requests (duplicates are removed)"""
+        unique_keys = {
+            (item.secid, item.engine, item.market, item.session): item for item in self.securities
+        }
+        return [
+            SecurityDayHistoryModel.construct(
+                secid=secid,
+                engine=engine,
+                market=market,
+                session=session,
+                start_date=self.start_date,
+                end_date=self.end_date,
+                interval=self.interval,
+            )
+            for secid, engine, market, session in unique_keys
+        ]
 
 
 class WorkWithDayHistory:
@@ -49,19 +122,24 @@ class WorkWithDayHistory:
     SQL_INSERT_LOG = """
         INSERT INTO logs_session_security_history (start_date, end_date, engine, market, session, secid, status)
         VALUES ($1, $2, $3, $4, $5, $6, $7)
+        ON CONFLICT DO NOTHING
         RETURNING id;
     """
+    SQL_GET_LOG_ID = """
+        SELECT id FROM logs_session_security_history
+        WHERE start_date=$1 AND end_date=$2 AND engine=$3 AND market=$4 AND session=$5 AND secid=$6
+    """
     SQL_DELETE_LOG_TRANSACTION = """
         DELETE FROM logs_session_security_history WHERE id=$1
     """
-    SQL_INSERT_HISTORY = """
-        INSERT INTO session_security_history (%s) values (%s) ON CONFLICT DO NOTHING;
-    """
     SQL_UPDATE_WAIT_REQUEST = """
         UPDATE logs_session_security_history SET status='success' WHERE id=$1
     """
-    SQL_CHECK_WAIT_REQUESTS = """
-        SELECT id, status FROM logs_session_security_history WHERE id in (%s)
+    SQL_COUNT_BOARDS = """
+        SELECT count(*) FROM security_boards
+        WHERE secid=$1 AND engine=$2 AND market=$3
+        AND (history_from IS NULL OR history_from <= $5)
+        AND (history_till IS NULL OR history_till >= $4)
     """
     SQL_GET_RESULT = """
         SELECT boardid,
@@ -89,15 +167,36 @@ class WorkWithDayHistory:
         WHERE secid=$1
         AND tradedate between $2 AND $3
     """
+    SQL_GET_RESULT_BY_INTERVAL = """
+        SELECT boardid,
+            date_trunc($4, tradedate::timestamp)::date as tradedate,
+            max(tradedate) as last_tradedate,
+            (array_agg(shortname ORDER BY tradedate DESC))[1] as shortname,
+            secid,
+            sum(numtrades)::bigint as numtrades,
+            sum(value) as value,
+            (array_agg(open ORDER BY tradedate) FILTER (WHERE open IS NOT NULL))[1] as open,
+            min(low) as low,
+            max(high) as high,
+            sum(waprice * volume) FILTER (WHERE waprice IS NOT NULL) / nullif(
+                sum(volume) FILTER (WHERE waprice IS NOT NULL), 0
+            ) as waprice,
+            (array_agg(close ORDER BY tradedate DESC) FILTER (WHERE close IS NOT NULL))[1] as close,
+            sum(volume) as volume,
+            count(*) as trade_days
+        FROM session_security_history
+        WHERE secid=$1
+        AND tradedate between $2 AND $3
+        GROUP BY boardid, secid, date_trunc($4, tradedate::timestamp)
+        ORDER BY boardid, tradedate
+    """
 
-    DATE_FORMAT = "%Y-%m-%d"
 
     __slots__ = (
         "request",
         "wait_id_request",
         "url_history",
         "wait_save_id",
-        "session",
         "columns",
         "trade_date_index",
         "cursor_columns",
@@ -106,12 +205,15 @@ class WorkWithDayHistory:
         "cursor_size_idx",
     )
 
+    @property
+    def coverage_key(self) -> tuple:
+        return self.request.secid, self.request.engine, self.request.market, int(self.request.session)
+
     def __init__(self, request: SecurityDayHistoryModel):
         self.request = request
         self.wait_id_request: set = set()
         self.url_history: str = settings.POINT_SECURITY_DAY_HISTORY.format(**dict(request))
         self.wait_save_id: set = set()
-        self.session: aiohttp.ClientSession | None = None
         self.columns: list = []
         self.trade_date_index: int | None = None
         self.cursor_columns: list = []
@@ -119,28 +221,23 @@ class WorkWithDayHistory:
         self.cursor_total_idx: int | None = None
         self.cursor_size_idx: int | None = None
 
-    def __del__(self):
-        if self.session and not self.session.closed:
-            try:
-                asyncio.get_running_loop().create_task(self.session.close())
-            except Exception:
-                pass
-
-    async def save_wait_transaction(self, start_date: date, end_date: date) -> int:
+    async def save_wait_transaction(self, start_date: date, end_date: date) -> int | None:
+        """Return id of new log. If same period is already loading by other request - None (wait it)"""
+        log_key = [
+            start_date,
+            end_date,
+            self.request.engine,
+            self.request.market,
+            self.request.session,
+            self.request.secid,
+        ]
         async with MOEX_DB.pool.acquire() as connection:
             try:
-                wait_id = await connection.fetchval(
-                    self.SQL_INSERT_LOG,
-                    *[
-                        start_date,
-                        end_date,
-                        self.request.engine,
-                        self.request.market,
-                        self.request.session,
-                        self.request.secid,
-                        'wait',
-                    ],
-                )
+                wait_id = await connection.fetchval(self.SQL_INSERT_LOG, *log_key, 'wait')
+                if wait_id is None:
+                    if (other_id := await connection.fetchval(self.SQL_GET_LOG_ID, *log_key)) is not None:
+                        self.wait_id_request.add(other_id)
+                    return None
                 self.wait_save_id.add(wait_id)
                 return wait_id
             except PostgresError as err:
@@ -151,25 +248,27 @@ class WorkWithDayHistory:
     async def delete_wait_transaction(self, transaction_id: int):
         async with MOEX_DB.pool.acquire() as connection:
             await connection.execute(self.SQL_DELETE_LOG_TRANSACTION, transaction_id)
+            await HISTORY_WAITERS.notify(connection, transaction_id, STATUS_ERROR)
+        HISTORY_WAITERS.resolve(transaction_id, STATUS_ERROR)
         self.wait_save_id.remove(transaction_id)
 
     def date_str_to_date(self, data):
         for row in data:
-            row[self.trade_date_index] = datetime.strptime(row[self.trade_date_index], self.DATE_FORMAT).date()
+            row[self.trade_date_index] = parse_date(row[self.trade_date_index])
 
+    @ISS_REQUEST_SECONDS.time(endpoint="history_from_api")
     async def history_from_api(self, start_date: str, end_date: str, start: int, only_data: bool = True) -> dict | list:
         params = {"from": start_date, "till": end_date, "start": start}
         with logger.catch(reraise=True):
             async with REQUEST_SEMAPHORE:
-                async with self.session.get(self.url_history, params=params) as request:
-                    status = request.status
-                    if not (200 <= status < 300):
-                        raise HTTPException(
-                            status_code=status,
-                            detail=f"History {start_date} - {end_date} by secid [{self.request.secid}] "
-                                   f"return status - {status}"
-                        )
-                    result = await request.json()
+                try:
+                    result = await MOEX_CLIENT.get_json(self.url_history, params=params)
+                except MoexApiError as error:
+                    raise HTTPException(
+                        status_code=error.status,
+                        detail=f"History {start_date} - {end_date} by secid [{self.request.secid}] "
+                               f"return status - {error.status}"
+                    )
             if not self.columns:
                 self.columns = result["history"]["columns"]
                 self.trade_date_index = self.columns.index(self.TRADE_DATE_COLUMN)
@@ -184,62 +283,131 @@ class WorkWithDayHistory:
             await transaction.start()
             try:
                 await connection.execute(self.SQL_UPDATE_WAIT_REQUEST, wait_id)
+                await HISTORY_WAITERS.notify(connection, wait_id, STATUS_SUCCESS)
                 if data:
-                    await connection.executemany(
-                        self.SQL_INSERT_HISTORY % (
-                            ', '.join(self.columns),
-                            ', '.join([f'${idx}' for idx in range(1, len(self.columns) + 1)])
-                        ),
-                        data,
+                    await bulk_upsert(connection, "session_security_history", self.columns, data)
+                    await TRADING_CALENDAR.save_days(
+                        connection,
+                        self.request.engine,
+                        self.request.market,
+                        {row[self.trade_date_index] for row in data},
+                        is_trading=True,
                     )
+                    await refresh_security_summary(connection, [self.request.secid])
                 await transaction.commit()
             except PostgresError as error:
                 await transaction.rollback()
                 await connection.execute(self.SQL_DELETE_LOG_TRANSACTION, wait_id)
+                await HISTORY_WAITERS.notify(connection, wait_id, STATUS_ERROR)
+                HISTORY_WAITERS.resolve(wait_id, STATUS_ERROR)
                 self.wait_save_id.remove(wait_id)
-                await transaction.commit()
                 logger.error("SAVE ERROR: {}", error)
                 raise HTTPException(status_code=500, detail="SOME PROBLEM WITH SAVE RESULT")
+        HISTORY_WAITERS.resolve(wait_id, STATUS_SUCCESS)
+        await self.merge_success_history()
+
+    async def merge_success_history(self):
+        """Merge adjacent success intervals of secid to keep logs table small. Errors are not critical"""
+        async with MOEX_DB.pool.acquire() as connection:
+            try:
+                async with connection.transaction():
+                    await connection.execute(raw_sql_lock_history_key, *self.coverage_key)
+                    await connection.execute(raw_sql_merge_success_history, *self.coverage_key)
+            except PostgresError as error:
+                logger.error("Merge history logs by {} error: {}", self.coverage_key, error)
+
+    def set_cursor_columns(self, result: dict):
+        if not self.cursor_columns:
+            self.cursor_columns = result["history.cursor"]["columns"]
+            self.cursor_index_idx = self.cursor_columns.index(self.CURSOR_INDEX_COLUMN)  # FIXME: NOT USE
+            self.cursor_total_idx = self.cursor_columns.index(self.CURSOR_TOTAL_COLUMN)
+            self.cursor_size_idx = self.cursor_columns.index(self.CURSOR_SIZE_COLUMN)
+
+    async def get_boards_count(self, start_date: date, end_date: date) -> int:
+        async with MOEX_DB.pool.acquire() as connect:
+            count = await connect.fetchval(
+                self.SQL_COUNT_BOARDS,
+                self.request.secid,
+                self.request.engine,
+                self.request.market,
+                start_date,
+                end_date,
+            )
+        return max(count or 0, 1)
+
+    async def expected_pages(self, start_date: date, end_date: date) -> int:
+        """Pages by estimation of rows: trading days (by calendar) * boards of security"""
+        rows = TRADING_CALENDAR.trading_days(self.request.engine, self.request.market, start_date, end_date) * \
+            await self.get_boards_count(start_date, end_date)
+        return min(max(ceil(rows / settings.HISTORY_PAGE_SIZE), 1), settings.HISTORY_PREFETCH_MAX_PAGES)
+
+    async def get_pages(self, start_date_str: str, end_date_str: str, starts: Iterable[int]) -> list[dict]:
+        """Pages are requested concurrently, on first error other requests are cancelled"""
+        tasks = [
+            asyncio.create_task(self.history_from_api(start_date_str, end_date_str, start=start, only_data=False))
+            for start in starts
+        ]
+        try:
+            return await asyncio.gather(*tasks)
+        except Exception as error:
+            [task.cancel() for task in tasks if not task.done()]
+            if not isinstance(error, HTTPException):
+                logger.error("Catch error for get day history from moex api: {}", error)
+            raise error
 
     async def history_api(self, start_date: date, end_date: date):
-        wait_id = await self.save_wait_transaction(start_date, end_date)
+        """Speculative pages by estimated rows count are requested at once (without serial first request),
+        pages after estimation - by cursor. Empty pages are dropped.
+        Period of days known as non-trading (by calendar) is saved as loaded without request to api."""
+        if (wait_id := await self.save_wait_transaction(start_date, end_date)) is None:
+            return
+        period = TRADING_CALENDAR.trim(self.request.engine, self.request.market, start_date, end_date)
+        if period is None:
+            await self.save_data(wait_id, [])
+            return
+        start_date, end_date = period
         start_date_str, end_date_str = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
-        first_request = await self.history_from_api(start_date_str, end_date_str, start=0, only_data=False)
-        final_data = first_request["history"]["data"]
-        if final_data:
-            if not self.cursor_columns:
-                self.cursor_columns = first_request["history.cursor"]["columns"]
-                self.cursor_index_idx = self.cursor_columns.index(self.CURSOR_INDEX_COLUMN)  # FIXME: NOT USE
-                self.cursor_total_idx = self.cursor_columns.index(self.CURSOR_TOTAL_COLUMN)
-                self.cursor_size_idx = self.cursor_columns.index(self.CURSOR_SIZE_COLUMN)
-            cursor = first_request["history.cursor"]["data"][0]
-            if cursor[self.cursor_total_idx] > cursor[self.cursor_size_idx]:
+        step = settings.HISTORY_PAGE_SIZE
+        try:
+            pages = await self.expected_pages(start_date, end_date)
+            results = await self.get_pages(start_date_str, end_date_str, range(0, pages * step, step))
+            final_data = [row for result in results for row in result["history"]["data"]]
+            if final_data:
+                self.set_cursor_columns(results[0])
+                cursor = results[0]["history.cursor"]["data"][0]
                 total, step = cursor[self.cursor_total_idx], cursor[self.cursor_size_idx]
-                start = step
-                tasks = []
-                while total > start:
-                    tasks.append(asyncio.create_task(self.history_from_api(start_date_str, end_date_str, start=start)))
-                    start += step
-                for done_task in asyncio.as_completed(tasks):
-                    try:
-                        final_data.extend(await done_task)
-                    except Exception as error:
-                        [task.cancel() for task in tasks if not task.done()]
-                        if not isinstance(error, HTTPException):
-                            logger.error("Catch error for get day history from moex api: {}", error)
-                        await self.delete_wait_transaction(wait_id)
-                        raise error
+                fetched = pages * settings.HISTORY_PAGE_SIZE
+                if step != settings.HISTORY_PAGE_SIZE:  # PAGE SIZE OF ISS IS CHANGED: RELOAD BY CURSOR
+                    fetched = len(final_data)
+                    logger.warning("ISS page size {} != HISTORY_PAGE_SIZE {}", step, settings.HISTORY_PAGE_SIZE)
+                if total > fetched:
+                    results = await self.get_pages(start_date_str, end_date_str, range(fetched, total, step))
+                    final_data.extend(row for result in results for row in result["history"]["data"])
+        except Exception:
+            await self.delete_wait_transaction(wait_id)
+            raise
         await self.save_data(wait_id, final_data)
 
+    @staticmethod
+    def split_period(start_date: date, end_date: date) -> list[tuple[date, date]]:
+        """Long period is split for parallel requests"""
+        step = timedelta(days=settings.HISTORY_SPLIT_DAYS)
+        periods = []
+        while start_date <= end_date:
+            periods.append((start_date, min(start_date + step - timedelta(days=1), end_date)))
+            start_date += step
+        return periods
+
     async def get_request_parameters(self) -> list[dict]:
         request_value = [getattr(self.request, column) for column in self.LOG_ATTRIBUTES_ORDER]
         async with MOEX_DB.pool.acquire() as connect:
             return [dict(row) for row in await connect.fetch(raw_sql_get_requests_to_api_history, *request_value)]
 
     async def get_async_request_to_api(self, params: list[dict]) -> bool:
-        request_date = [data["request_date"] for data in params if data["request_date"]]
+        request_date = [
+            period for data in params if data["request_date"] for period in self.split_period(*data["request_date"])
+        ]
         if request_date:
-            self.session = aiohttp.ClientSession()
             first_error = None
             tasks = [asyncio.create_task(self.history_api(*dates)) for dates in request_date]
 
@@ -259,66 +427,179 @@ class WorkWithDayHistory:
             return True
         return False
 
-    async def check_waited_requests(self, sleep_time: float):
-        await asyncio.sleep(sleep_time)
-        async with MOEX_DB.pool.acquire() as connection:
-            result = await connection.fetch(self.SQL_CHECK_WAIT_REQUESTS % ', '.join(map(str, self.wait_id_request)))
-
-        if len(result) != len(self.wait_id_request):
-            text_error = f"Has error in check status of request by {self.request.secid} " \
-                         f"on period {self.request.start_date} - {self.request.end_date}. " \
-                         f"FOR {self.request.engine}/{self.request.market}/{self.request.session.name}"
-            logger.exception(text_error)
-            raise HTTPException(status_code=500, detail=text_error)
-        for value in result:
-            dict_value = dict(value)
-            if dict_value["status"] == "success":
-                self.wait_id_request.remove(dict_value["id"])
-        if len(self.wait_id_request) == 0:
-            return True
-        return False
+    def result_query(self) -> tuple[str, list]:
+        """Day rows or bars aggregated by request interval (OHLCV resampling in Postgres)"""
+        args = [self.request.secid, self.request.start_date, self.request.end_date]
+        if self.request.interval == HistoryInterval.day:
+            return self.SQL_GET_RESULT, args
+        return self.SQL_GET_RESULT_BY_INTERVAL, args + [self.request.interval.value]
 
-    async def get_result(self):
+    async def get_records(self) -> list[Record]:
+        sql, args = self.result_query()
         async with MOEX_DB.pool.acquire() as connect:
-            raw_result = await connect.fetch(
-                self.SQL_GET_RESULT,
-                self.request.secid,
-                self.request.start_date,
-                self.request.end_date
-            )
-        if raw_result:
-            columns = list(dict(raw_result[0]).keys())
-            data = []
-            for row in raw_result:
-                tmp_dict = dict(row)
-                data.append([tmp_dict[key] for key in columns])
-            return {"columns": columns, "data": data}
+            return await connect.fetch(sql, *args)
+
+    async def stream_records(self) -> AsyncIterator[list[Record]]:
+        """Result by chunks from server-side cursor (memory doesn't depend on size of period)"""
+        sql, args = self.result_query()
+        async with MOEX_DB.pool.acquire() as connect:
+            async with connect.transaction():
+                cursor = await connect.cursor(sql, *args)
+                while chunk := await cursor.fetch(settings.HISTORY_STREAM_CHUNK_SIZE):
+                    yield chunk
+
+    async def get_result(self):
+        if raw_result := await self.get_records():
+            return {"columns": list(raw_result[0].keys()), "data": [list(row.values()) for row in raw_result]}
         return None
 
-    async def get_history_from_api(self):
-        params = await self.get_request_parameters()
+    async def load_history(self, params: list[dict] | None = None, retry: bool = True):
+        """Load missing periods from moex api and wait periods loaded by other requests.
+        params - result of gap planning (raw_sql_get_requests_to_api_history), will be requested if not set.
+        If awaited request is failed, periods are planned and loaded again (once)."""
+        key = self.coverage_key
+        if params is None:
+            if COVERAGE_CACHE.is_covered(key, self.request.start_date, self.request.end_date):
+                return
+            params = await self.get_request_parameters()
         self.wait_id_request = {data["id"] for data in params if data["wait_status"]}
-        has_request_to_api = await self.get_async_request_to_api(params)
+        await self.get_async_request_to_api(params)
 
         if self.wait_id_request:
-            sleep_time = 0 if has_request_to_api else 0.5
-            for _ in range(5):
-                if await self.check_waited_requests(sleep_time):
-                    break
-                sleep_time += 1  # MAX WAIT 15 seconds
-            else:
-                text_error = f"For day history logs_id: {self.wait_id_request} not return result from moex api."
-                logger.exception(text_error)
-                raise HTTPException(status_code=500, detail=text_error)
+            description = f"{self.request.secid} on period {self.request.start_date} - {self.request.end_date}. " \
+                          f"FOR {self.request.engine}/{self.request.market}/{self.request.session.name}"
+            if failed := await HISTORY_WAITERS.wait(self.wait_id_request, description):
+                if not retry:
+                    text_error = f"Has error in request of day history {description}: {failed}"
+                    logger.error(text_error)
+                    raise HTTPException(status_code=500, detail=text_error)
+                return await self.load_history(retry=False)
+        COVERAGE_CACHE.add(key, self.request.start_date, self.request.end_date)
 
+    async def get_history_from_api(self):
+        await self.load_history()
         return await self.get_result()
 
+    async def get_records_from_api(self) -> list[Record]:
+        await self.load_history()
+        return await self.get_records()
+
+
+class WorkWithBatchDayHistory:
+    """Day history for many securities: one gap planning query and common workers limit"""
+    REQUEST_KEY = ("secid", "engine", "market", "session")
+
+    __slots__ = (
+        "request",
+        "requests",
+        "semaphore",
+    )
+
+    def __init__(self, request: SecuritiesDayHistoryModel):
+        self.request = request
+        self.requests = request.security_requests()
+        self.semaphore = asyncio.Semaphore(settings.MAX_BATCH_HISTORY_WORKER)
+
+    async def get_request_parameters(self) -> dict[tuple, list[dict]]:
+        """Plan gaps for all securities by one query. Securities covered in memory are skipped"""
+        requests = [
+            request for request in self.requests
+            if not COVERAGE_CACHE.is_covered(
+                tuple(getattr(request, column) for column in self.REQUEST_KEY),
+                self.request.start_date,
+                self.request.end_date,
+            )
+        ]
+        if not requests:
+            return {}
+        columns = [[getattr(request, column) for request in requests] for column in self.REQUEST_KEY]
+        async with MOEX_DB.pool.acquire() as connect:
+            rows = await connect.fetch(
+                raw_sql_get_requests_to_api_history_batch,
+                *columns,
+                self.request.start_date,
+                self.request.end_date,
+            )
+        params = defaultdict(list)
+        for row in rows:
+            params[tuple(row[column] for column in self.REQUEST_KEY)].append(
+                {"id": row["id"], "wait_status": row["wait_status"], "request_date": row["request_date"]}
+            )
+        return params
+
+    async def load_security(
+            self,
+            worker: WorkWithDayHistory,
+            params: list[dict],
+    ) -> tuple[WorkWithDayHistory, HTTPException | None]:
+        async with self.semaphore:
+            try:
+                await worker.load_history(params)
+            except HTTPException as error:
+                return worker, error
+        return worker, None
+
+    @staticmethod
+    def to_line(data: dict) -> bytes:
+        return json_dumps(data) + b"\n"
+
+    async def stream_result(self) -> AsyncIterator[bytes]:
+        """Stream NDJSON: one line for every secid, in order of readiness"""
+        params = await self.get_request_parameters()
+        workers = []
+        for request in self.requests:
+            worker = WorkWithDayHistory(request)
+            key = tuple(getattr(request, column) for column in self.REQUEST_KEY)
+            workers.append(asyncio.create_task(self.load_security(worker, params.get(key, []))))
+        try:
+            for done_task in asyncio.as_completed(workers):
+                worker, error = await done_task
+                if error is not None:
+                    yield self.to_line(
+                        {"secid": worker.request.secid, "error": error.detail, "status_code": error.status_code}
+                    )
+                    continue
+                if result := await worker.get_result():
+                    yield self.to_line({"secid": worker.request.secid, **result})
+                else:
+                    yield self.to_line({"secid": worker.request.secid, "error": "Data not found!", "status_code": 404})
+        finally:
+            for task in workers:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
 
 @router_security_history.post("/security_by_days", tags=["Days History"])
-async def get_days_history(data: SecurityDayHistoryModel):
+async def get_days_history(
+        data: SecurityDayHistoryModel,
+        response_format: HistoryFormat | None = Query(
+            default=None,
+            alias="format",
+            description="Response format. If not set, used 'Accept' header (json by default)",
+        ),
+        accept: str | None = Header(default=None),
+):
+    response_format = negotiate_format(accept, response_format)  # NOT AVAILABLE FORMAT - BEFORE ANY WORK
     await check_default_values(data)
     worker = WorkWithDayHistory(data)
-    result = await worker.get_history_from_api()
-    if result:
-        return result
+    if response_format in STREAM_FORMATS:
+        await worker.load_history()
+        chunks = worker.stream_records()
+        if first_chunk := await anext(chunks, None):
+            return streaming_response(first_chunk, chunks, response_format)
+    elif response_format == HistoryFormat.json:
+        result = await worker.get_history_from_api()
+        if result:
+            return FastJSONResponse(result)
+    elif records := await worker.get_records_from_api():
+        return columnar_response(records, response_format)
     raise HTTPException(status_code=404, detail="Data not found!")
+
+
+@router_security_history.post("/securities_by_days", tags=["Days History"])
+async def get_days_history_batch(data: SecuritiesDayHistoryModel):
+    """Day history for list of securities. Response is NDJSON stream, one line by secid"""
+    await asyncio.gather(*[check_default_values(security) for security in data.securities])
+    worker = WorkWithBatchDayHistory(data)
+    return StreamingResponse(worker.stream_result(), media_type="application/x-ndjson")
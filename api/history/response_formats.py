@@ -0,0 +1,167 @@
+"""
+COLUMNAR RESPONSE FORMATS FOR HISTORY DATA.
+Arrays are built directly from asyncpg records (by columns), without dict for every row.
+"""
+import io
+from enum import Enum
+from typing import AsyncIterator, Sequence
+
+import numpy as np
+from asyncpg import Record
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from utils.http.fast_json import json_dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # OPTIONAL DEPENDENCY
+    pa = None
+    pa_ipc = None
+
+
+class HistoryFormat(str, Enum):
+    json = "json"
+    arrow = "arrow"
+    npy = "npy"
+    npz = "npz"
+    ndjson = "ndjson"
+    json_stream = "json_stream"
+
+
+STREAM_FORMATS = {HistoryFormat.ndjson, HistoryFormat.json_stream}
+MEDIA_TYPES = {
+    HistoryFormat.json: "application/json",
+    HistoryFormat.ndjson: "application/x-ndjson",
+    HistoryFormat.json_stream: "application/json",
+    HistoryFormat.arrow: "application/vnd.apache.arrow.stream",
+    HistoryFormat.npy: "application/x-npy",
+    HistoryFormat.npz: "application/x-npz",
+}
+FORMAT_BY_MEDIA_TYPE = {
+    media_type: format_ for format_, media_type in MEDIA_TYPES.items() if format_ != HistoryFormat.json_stream
+}
+
+STRING_COLUMNS = {"boardid", "shortname", "secid"}
+DTYPES = {
+    "tradedate": "datetime64[D]",
+    "last_tradedate": "datetime64[D]",
+    "trade_days": np.int64,
+    "numtrades": np.int64,
+    "tradingsession": np.int16,
+}
+DEFAULT_DTYPE = np.float64
+
+
+def format_is_available(format_: HistoryFormat) -> bool:
+    return format_ != HistoryFormat.arrow or pa is not None
+
+
+def arrow_is_not_available() -> HTTPException:
+    return HTTPException(status_code=406, detail="Arrow format is not available: 'pyarrow' is not installed")
+
+
+def negotiate_format(accept: str | None, format_: HistoryFormat | None = None) -> HistoryFormat:
+    """Query parameter has priority, then first known and available media type from 'Accept' header.
+    Default - json. Not available format (before any loading of history) - 406"""
+    if format_ is not None:
+        if not format_is_available(format_):
+            raise arrow_is_not_available()
+        return format_
+    if accept:
+        requested = False
+        for media_range in accept.split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in FORMAT_BY_MEDIA_TYPE:
+                if format_is_available(FORMAT_BY_MEDIA_TYPE[media_type]):
+                    return FORMAT_BY_MEDIA_TYPE[media_type]
+                requested = True
+            elif media_type in ("*/*", "application/*"):
+                return HistoryFormat.json
+        if requested:
+            raise arrow_is_not_available()
+    return HistoryFormat.json
+
+
+def column_to_array(name: str, values: Sequence) -> np.ndarray:
+    if name in STRING_COLUMNS:
+        return np.array(["" if value is None else value for value in values], dtype=np.str_)
+    return np.array(values, dtype=DTYPES.get(name, DEFAULT_DTYPE))
+
+
+def records_to_arrays(records: list[Record]) -> dict[str, np.ndarray]:
+    columns = list(records[0].keys())
+    return {name: column_to_array(name, values) for name, values in zip(columns, zip(*records))}
+
+
+def arrays_to_npz(arrays: dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def arrays_to_npy(arrays: dict[str, np.ndarray]) -> bytes:
+    """One structured array, fields - columns"""
+    size = len(next(iter(arrays.values())))
+    structured = np.empty(size, dtype=[(name, array.dtype) for name, array in arrays.items()])
+    for name, array in arrays.items():
+        structured[name] = array
+    buffer = io.BytesIO()
+    np.save(buffer, structured, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def arrays_to_arrow(arrays: dict[str, np.ndarray]) -> bytes:
+    if pa is None:
+        raise arrow_is_not_available()
+    table = pa.table({name: pa.array(array, from_pandas=True) for name, array in arrays.items()})
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+SERIALIZERS = {
+    HistoryFormat.arrow: arrays_to_arrow,
+    HistoryFormat.npy: arrays_to_npy,
+    HistoryFormat.npz: arrays_to_npz,
+}
+
+
+def columnar_response(records: list[Record], format_: HistoryFormat) -> Response:
+    content = SERIALIZERS[format_](records_to_arrays(records))
+    return Response(content=content, media_type=MEDIA_TYPES[format_])
+
+
+def _dumps(value) -> str:
+    return json_dumps(value).decode()
+
+
+async def _ndjson(columns: list[str], first_chunk: list[Record], chunks: AsyncIterator[list[Record]]):
+    """First line - columns, then one row (array) by line"""
+    yield _dumps(columns) + "\n"
+    yield "".join(_dumps(list(row.values())) + "\n" for row in first_chunk)
+    async for chunk in chunks:
+        yield "".join(_dumps(list(row.values())) + "\n" for row in chunk)
+
+
+async def _json_array(columns: list[str], first_chunk: list[Record], chunks: AsyncIterator[list[Record]]):
+    """Same document as json format ({"columns": [...], "data": [...]}), sent by chunks"""
+    yield '{"columns": %s, "data": [' % _dumps(columns)
+    yield ", ".join(_dumps(list(row.values())) for row in first_chunk)
+    async for chunk in chunks:
+        yield ", " + ", ".join(_dumps(list(row.values())) for row in chunk)
+    yield "]}"
+
+
+def streaming_response(
+        first_chunk: list[Record],
+        chunks: AsyncIterator[list[Record]],
+        format_: HistoryFormat,
+) -> StreamingResponse:
+    stream = _ndjson if format_ == HistoryFormat.ndjson else _json_array
+    return StreamingResponse(
+        stream(list(first_chunk[0].keys()), first_chunk, chunks),
+        media_type=MEDIA_TYPES[format_],
+    )
@@ -0,0 +1,139 @@
+"""
+TRADING CALENDAR BY ENGINE/MARKET.
+Days are saved in trading_calendar: trading days - from saved history, non-trading - from full market sync
+(market has no rows for date). In memory every market is a bitmap (numpy bool arrays by days from START_DATE).
+Days are skipped (not requested from ISS) only if they are known as non-trading: unknown days (weekends too -
+transferred working Saturdays, weekend sessions) are possibly trading. Business days (Mon-Fri) of unknown days
+are used only for estimation of rows.
+"""
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+from asyncpg import Connection
+from loguru import logger
+
+from db import MOEX_DB
+from utils import singleton
+
+START_DATE = date(2015, 1, 1)
+
+SQL_LOAD_CALENDAR = "SELECT engine, market, tradedate, is_trading FROM trading_calendar"
+SQL_IS_EMPTY_CALENDAR = "SELECT NOT exists(SELECT 1 FROM trading_calendar)"
+SQL_SAVE_DAYS = """
+    INSERT INTO trading_calendar (engine, market, tradedate, is_trading)
+    SELECT $1, $2, tradedate, $4 FROM unnest($3::date[]) AS tradedate
+    ON CONFLICT (engine, market, tradedate) DO UPDATE SET is_trading = EXCLUDED.is_trading
+    WHERE trading_calendar.is_trading != EXCLUDED.is_trading
+"""
+SQL_DERIVE_FROM_HISTORY = """
+    INSERT INTO trading_calendar (engine, market, tradedate, is_trading)
+    SELECT DISTINCT e.name, m.market_name, h.tradedate, true
+    FROM session_security_history h
+    JOIN boards b ON b.boardid = h.boardid
+    JOIN engines e ON e.id = b.engine_id
+    JOIN markets m ON m.id = b.market_id
+    ON CONFLICT (engine, market, tradedate) DO UPDATE SET is_trading = true
+    WHERE NOT trading_calendar.is_trading
+"""
+
+
+class MarketCalendar:
+    __slots__ = ("known", "trading")
+
+    def __init__(self, size: int):
+        self.known = np.zeros(size, dtype=bool)
+        self.trading = np.zeros(size, dtype=bool)
+
+    def ensure(self, size: int):
+        if size > len(self.known):
+            self.known = np.concatenate([self.known, np.zeros(size - len(self.known), dtype=bool)])
+            self.trading = np.concatenate([self.trading, np.zeros(size - len(self.trading), dtype=bool)])
+
+
+@singleton
+class TradingCalendar:
+    def __init__(self):
+        self._markets: dict[tuple[str, str], MarketCalendar] = {}
+        self._business_days = np.zeros(0, dtype=bool)
+
+    @staticmethod
+    def _index(value: date) -> int:
+        return (value - START_DATE).days
+
+    def _size(self, end_date: date) -> int:
+        size = max(self._index(end_date) + 1, 0)
+        if size > len(self._business_days):
+            size = max(size, len(self._business_days) * 2, 366)
+            days = np.arange(np.datetime64(START_DATE), np.datetime64(START_DATE) + size, dtype="datetime64[D]")
+            self._business_days = np.is_busday(days)
+        return size
+
+    def _market(self, engine: str, market: str, end_date: date) -> MarketCalendar:
+        size = self._size(end_date)
+        if (calendar := self._markets.get((engine, market))) is None:
+            calendar = self._markets[(engine, market)] = MarketCalendar(size)
+        calendar.ensure(size)
+        return calendar
+
+    def set_days(self, engine: str, market: str, days: Iterable[date], is_trading: bool):
+        days = [day for day in days if day >= START_DATE]
+        if not days:
+            return
+        calendar = self._market(engine, market, max(days))
+        positions = np.array([self._index(day) for day in days], dtype=np.int64)
+        calendar.known[positions] = True
+        calendar.trading[positions] = is_trading
+
+    async def save_days(self, connection: Connection, engine: str, market: str, days: Iterable[date],
+                        is_trading: bool):
+        """Save in DB (in transaction of connection) and in memory"""
+        days = list(days)
+        await connection.execute(SQL_SAVE_DAYS, engine, market, days, is_trading)
+        self.set_days(engine, market, days, is_trading)
+
+    async def load(self):
+        async with MOEX_DB.pool.acquire() as connection:
+            if await connection.fetchval(SQL_IS_EMPTY_CALENDAR):
+                await connection.execute(SQL_DERIVE_FROM_HISTORY)
+            rows = await connection.fetch(SQL_LOAD_CALENDAR)
+        days = {}
+        for engine, market, tradedate, is_trading in rows:
+            days.setdefault((engine, market, is_trading), []).append(tradedate)
+        for (engine, market, is_trading), values in days.items():
+            self.set_days(engine, market, values, is_trading)
+        logger.info("Trading calendar loaded: {} days of {} markets", len(rows), len(self._markets))
+
+    def _possible_trading(
+            self, engine: str, market: str, start_date: date, end_date: date, estimate: bool = False
+    ) -> np.ndarray:
+        """Bool array by days of period: known trading day or unknown day (estimate - unknown business day)"""
+        start_date = max(start_date, START_DATE)
+        if start_date > end_date:
+            return np.zeros(0, dtype=bool)
+        calendar = self._market(engine, market, end_date)
+        period = slice(self._index(start_date), self._index(end_date) + 1)
+        unknown = self._business_days[period] if estimate else True
+        return np.where(calendar.known[period], calendar.trading[period], unknown)
+
+    def trading_days(self, engine: str, market: str, start_date: date, end_date: date) -> int:
+        """Estimation of trading days (for rows count): unknown days - by business days"""
+        return int(np.count_nonzero(self._possible_trading(engine, market, start_date, end_date, estimate=True)))
+
+    def is_non_trading(self, engine: str, market: str, day: date) -> bool:
+        """Only day which is known as non-trading (unknown day is possibly trading)"""
+        return day >= START_DATE and not self._possible_trading(engine, market, day, day)[0]
+
+    def trim(self, engine: str, market: str, start_date: date, end_date: date) -> tuple[date, date] | None:
+        """Period from first to last possible trading day. None - all days are known as non-trading"""
+        if start_date > end_date:
+            return None
+        if start_date < START_DATE:  # DAYS BEFORE CALENDAR ARE UNKNOWN
+            return start_date, end_date
+        days = np.flatnonzero(self._possible_trading(engine, market, start_date, end_date))
+        if not len(days):
+            return None
+        return start_date + timedelta(days=int(days[0])), start_date + timedelta(days=int(days[-1]))
+
+
+TRADING_CALENDAR = TradingCalendar()
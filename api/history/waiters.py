@@ -0,0 +1,117 @@
+"""
+COALESCING OF DAY HISTORY REQUESTS.
+Request that found 'wait' rows in logs_session_security_history awaits future of this log id.
+In the same process future is resolved by the loader directly, from other processes - by Postgres NOTIFY
+(sent in the transaction that saves data, so waiter wakes up only after commit).
+"""
+import asyncio
+from typing import Iterable
+
+import asyncpg
+from fastapi import HTTPException
+from loguru import logger
+
+from config import settings
+from db import MOEX_DB
+from utils import singleton
+from utils.metrics import WAIT_LOG_POLLS
+
+CHANNEL = "logs_session_security_history"
+STATUS_SUCCESS = "success"
+STATUS_ERROR = "error"
+STATUS_DELETED = "deleted"
+
+SQL_NOTIFY = "SELECT pg_notify($1, $2)"
+SQL_LOG_STATUSES = "SELECT id, status FROM logs_session_security_history WHERE id = any($1::bigint[])"
+
+
+@singleton
+class HistoryWaiters:
+    def __init__(self):
+        self._futures: dict[int, asyncio.Future] = {}
+        self._waiters: dict[int, int] = {}  # COUNT OF WAIT CALLS BY LOG ID
+        self._connection: asyncpg.Connection | None = None
+
+    async def start(self):
+        """Listen notifications from other processes (dedicated connection, not from pool)"""
+        if self._connection is None:
+            self._connection = await asyncpg.connect(dsn=settings.DB_DSN)
+            await self._connection.add_listener(CHANNEL, self._on_notify)
+
+    async def stop(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+        self._futures.clear()
+        self._waiters.clear()
+
+    @staticmethod
+    def payload(log_id: int, status: str) -> str:
+        return f"{log_id}:{status}"
+
+    async def notify(self, connection: asyncpg.Connection, log_id: int, status: str):
+        """Send status for other processes. In transaction message is delivered only after commit"""
+        await connection.execute(SQL_NOTIFY, CHANNEL, self.payload(log_id, status))
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        log_id, status = payload.split(":", 1)
+        self.resolve(int(log_id), status)
+
+    def _future(self, log_id: int) -> asyncio.Future:
+        if (future := self._futures.get(log_id)) is None:
+            future = self._futures[log_id] = asyncio.get_running_loop().create_future()
+        return future
+
+    def _release(self, log_ids: Iterable[int]):
+        """Not resolved future without other waiters is removed (timeouts don't leak futures)"""
+        for log_id in log_ids:
+            if (count := self._waiters.get(log_id, 0) - 1) > 0:
+                self._waiters[log_id] = count
+                continue
+            self._waiters.pop(log_id, None)
+            if (future := self._futures.get(log_id)) is not None and not future.done():
+                del self._futures[log_id]
+
+    def resolve(self, log_id: int, status: str):
+        if (future := self._futures.pop(log_id, None)) is not None and not future.done():
+            future.set_result(status)
+
+    async def _resolve_from_db(self, log_ids: Iterable[int]):
+        """Safety net for commits before subscription and lost notifications"""
+        log_ids = list(log_ids)
+        WAIT_LOG_POLLS.inc()
+        async with MOEX_DB.pool.acquire() as connection:
+            rows = await connection.fetch(SQL_LOG_STATUSES, log_ids)
+        statuses = {row["id"]: row["status"] for row in rows}
+        for log_id in log_ids:
+            status = statuses.get(log_id, STATUS_DELETED)
+            if status != "wait":
+                self.resolve(log_id, status)
+
+    async def wait(self, log_ids: Iterable[int], description: str) -> dict[int, str]:
+        """Wait until all log ids are loaded by other requests. Return failed (or merged) log ids with status.
+        Raise HTTPException on timeout"""
+        futures = {log_id: self._future(log_id) for log_id in log_ids}
+        for log_id in futures:
+            self._waiters[log_id] = self._waiters.get(log_id, 0) + 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.HISTORY_WAIT_TIMEOUT
+        try:
+            await self._resolve_from_db(log_id for log_id, future in futures.items() if not future.done())
+            while pending := [future for future in futures.values() if not future.done()]:
+                if (timeout := deadline - loop.time()) <= 0:
+                    text_error = f"For day history {description} logs_id: {sorted(futures)} not return result."
+                    logger.error(text_error)
+                    raise HTTPException(status_code=500, detail=text_error)
+                await asyncio.wait(pending, timeout=min(timeout, settings.HISTORY_WAIT_RECHECK))
+                await self._resolve_from_db(log_id for log_id, future in futures.items() if not future.done())
+        finally:
+            self._release(futures)
+
+        return {log_id: future.result() for log_id, future in futures.items() if future.result() != STATUS_SUCCESS}
+
+
+HISTORY_WAITERS = HistoryWaiters()
@@ -0,0 +1,36 @@
+"""
+METRICS ENDPOINT (Prometheus text format, or JSON snapshot with ?format=json).
+Gauges of queues and caches are calculated on request from existing stats.
+"""
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+
+from api.history.coverage import COVERAGE_CACHE
+from api.securities_info.search import SECURITY_SEARCH
+from config import QUEUE_PROCESS, QUEUE_THREAD
+from utils.cache.dictionaries import DICTIONARY_CACHE
+from utils.cache.responses import RESPONSE_CACHE
+from utils.database.write_behind import WRITE_BEHIND
+from utils.metrics import METRICS
+
+router_metrics = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+QUEUE_DEPTH = METRICS.gauge("moex_queue_depth", "Size of internal queues", ("queue",))
+QUEUE_DEPTH.set_function(QUEUE_THREAD.qsize, queue="thread")
+QUEUE_DEPTH.set_function(QUEUE_PROCESS.qsize, queue="process")
+QUEUE_DEPTH.set_function(lambda: WRITE_BEHIND.pending_rows, queue="write_behind_rows")
+
+CACHE_HIT_RATIO = METRICS.gauge("moex_cache_hit_ratio", "Hit ratio of in-memory caches", ("cache",))
+CACHE_HIT_RATIO.set_function(lambda: DICTIONARY_CACHE.stats.hit_ratio, cache="dictionaries")
+CACHE_HIT_RATIO.set_function(lambda: RESPONSE_CACHE.stats.hit_ratio, cache="responses")
+CACHE_HIT_RATIO.set_function(lambda: COVERAGE_CACHE.stats.hit_ratio, cache="history_coverage")
+CACHE_HIT_RATIO.set_function(lambda: SECURITY_SEARCH.stats.hit_ratio, cache="security_search")
+
+
+@router_metrics.get("")
+async def get_metrics(format: str = Query(default="prometheus", regex="^(prometheus|json)$")):
+    if format == "json":
+        return METRICS.snapshot()
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,186 @@
+"""
+FUZZY SEARCH OF SECURITIES (autocomplete).
+Queries from SEARCH_MIN_TRIGRAM_LENGTH symbols - trigram similarity by GIN index of security_description
+("NAME", SHORTNAME, ISIN) + prefix of SECID. Shorter queries (first keystrokes, trigrams are useless) -
+in-memory prefix index (sorted keys + bisect), reloaded every SEARCH_INDEX_TTL seconds.
+Pages are cached in memory (LRU + TTL). Pagination is keyset by (rank DESC, secid), cursor is opaque string.
+"""
+import asyncio
+import base64
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import APIRouter, HTTPException, Query
+from loguru import logger
+
+from config import settings
+from db import MOEX_DB
+from sql_requests.security_search import raw_sql_search_prefix_index, raw_sql_search_securities
+from utils import singleton
+from utils.http.fast_json import FastJSONResponse, json_dumps, json_loads
+
+router_security_search = APIRouter(default_response_class=FastJSONResponse)
+
+SEARCH_COLUMNS = ["secid", "shortname", "name", "isin", "rank"]
+SQL_SET_THRESHOLD = "SELECT set_config('pg_trgm.similarity_threshold', $1, true)"
+# RANKS OF PREFIX INDEX (SAME SCALE AS SIMILARITY)
+RANK_EXACT = 1.0
+RANK_SECID_PREFIX = 0.9
+RANK_TEXT_PREFIX = 0.8
+
+
+def encode_cursor(rank: float, secid: str) -> str:
+    return base64.urlsafe_b64encode(json_dumps([rank, secid])).decode()
+
+
+def decode_cursor(cursor: str | None) -> tuple[float | None, str | None]:
+    if not cursor:
+        return None, None
+    try:
+        rank, secid = json_loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), str(secid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Wrong cursor")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass
+class SearchStats:
+    hits: int = 0
+    misses: int = 0
+    prefix_queries: int = 0
+    trigram_queries: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@singleton
+class SecuritySearch:
+    def __init__(self):
+        self.stats = SearchStats()
+        self._pages: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        self._keys: list[str] = []  # SORTED LOWER TEXT (SECID, SHORTNAME, NAME, ISIN)
+        self._rows: list[tuple] = []  # (secid, shortname, name, isin, field) BY POSITION OF KEY
+        self._index_loaded_at: float | None = None
+        self._index_lock = asyncio.Lock()
+
+    async def load_index(self):
+        async with MOEX_DB.pool.acquire() as connection:
+            records = await connection.fetch(raw_sql_search_prefix_index)
+        entries = []
+        for secid, shortname, name, isin in records:
+            for field, text in (("secid", secid), ("shortname", shortname), ("name", name), ("isin", isin)):
+                if text:
+                    entries.append((text.lower(), (secid, shortname, name, isin, field)))
+        entries.sort(key=lambda entry: entry[0])
+        self._keys = [key for key, _ in entries]
+        self._rows = [row for _, row in entries]
+        self._index_loaded_at = time.monotonic()
+        self._pages.clear()
+        logger.info("Security search prefix index loaded: {} keys", len(self._keys))
+
+    async def ensure_index(self):
+        if self._index_loaded_at is not None and time.monotonic() - self._index_loaded_at < settings.SEARCH_INDEX_TTL:
+            return
+        async with self._index_lock:
+            if self._index_loaded_at is None or time.monotonic() - self._index_loaded_at >= settings.SEARCH_INDEX_TTL:
+                await self.load_index()
+
+    def prefix_matches(self, query: str) -> list[list]:
+        """All securities with prefix in secid/shortname/name/isin, sorted by (rank DESC, secid)"""
+        found: dict[str, list] = {}
+        position = bisect_left(self._keys, query)
+        while position < len(self._keys) and self._keys[position].startswith(query):
+            secid, shortname, name, isin, field = self._rows[position]
+            if field == "secid":
+                rank = RANK_EXACT if len(self._keys[position]) == len(query) else RANK_SECID_PREFIX
+            else:
+                rank = RANK_TEXT_PREFIX
+            if secid not in found or found[secid][-1] < rank:
+                found[secid] = [secid, shortname, name, isin, rank]
+            position += 1
+        return sorted(found.values(), key=lambda row: (-row[-1], row[0]))
+
+    async def prefix_page(self, query: str, limit: int, after: tuple) -> list[list]:
+        await self.ensure_index()
+        self.stats.prefix_queries += 1
+        rows = self.prefix_matches(query)
+        after_rank, after_secid = after
+        if after_rank is not None:
+            rows = [row for row in rows if (-row[-1], row[0]) > (-after_rank, after_secid)]
+        return rows[:limit]
+
+    async def trigram_page(self, query: str, limit: int, after: tuple) -> list[list]:
+        self.stats.trigram_queries += 1
+        after_rank, after_secid = after
+        async with MOEX_DB.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(SQL_SET_THRESHOLD, str(settings.SEARCH_SIMILARITY_THRESHOLD))
+                records = await connection.fetch(
+                    raw_sql_search_securities,
+                    query,
+                    query.upper(),
+                    escape_like(query.upper()) + "%",
+                    after_rank,
+                    after_secid,
+                    limit,
+                )
+        return [list(record.values()) for record in records]
+
+    def _cached(self, key: tuple) -> dict | None:
+        if (item := self._pages.get(key)) is None:
+            return None
+        expire_at, page = item
+        if expire_at < time.monotonic():
+            self._pages.pop(key, None)
+            return None
+        self._pages.move_to_end(key)
+        return page
+
+    def _cache(self, key: tuple, page: dict):
+        self._pages[key] = (time.monotonic() + settings.SEARCH_CACHE_TTL, page)
+        self._pages.move_to_end(key)
+        while len(self._pages) > settings.SEARCH_CACHE_MAX_SIZE:
+            self._pages.popitem(last=False)
+
+    async def search(self, query: str, limit: int, cursor: str | None) -> dict:
+        if not (query := " ".join(query.split())):
+            raise HTTPException(status_code=400, detail="Empty query")
+        key = (query.lower(), limit, cursor)
+        if (page := self._cached(key)) is not None:
+            self.stats.hits += 1
+            return page
+        self.stats.misses += 1
+        after = decode_cursor(cursor)
+        if len(query) < settings.SEARCH_MIN_TRIGRAM_LENGTH:
+            rows = await self.prefix_page(query.lower(), limit, after)
+        else:
+            rows = await self.trigram_page(query, limit, after)
+        page = {
+            "columns": SEARCH_COLUMNS,
+            "data": rows,
+            "next": encode_cursor(rows[-1][-1], rows[-1][0]) if len(rows) == limit else None,
+        }
+        self._cache(key, page)
+        return page
+
+
+SECURITY_SEARCH = SecuritySearch()
+
+
+@router_security_search.get("/search", description="Fuzzy search of securities (secid, name, isin)",
+                            tags=["security"])
+async def search_securities(
+        q: str = Query(min_length=1, max_length=100),
+        limit: int = Query(default=settings.SEARCH_PAGE_SIZE, ge=1, le=100),
+        cursor: str | None = Query(default=None, description="'next' from previous page"),
+):
+    return FastJSONResponse(await SECURITY_SEARCH.search(q, limit, cursor))
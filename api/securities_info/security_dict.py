@@ -1,22 +1,27 @@
 import asyncio
 from typing import Literal
 
-import aiohttp
 from loguru import logger
-from datetime import date, datetime
+from datetime import date
 from fastapi import APIRouter, Query, HTTPException
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from starlette import status
 
-from config import settings
+from config import settings, SECURITY_REQUEST_SEMAPHORE
 from db import MOEX_DB
+from moex_client import MOEX_CLIENT, MoexApiError
+from utils.cache.responses import RESPONSE_CACHE
+from utils.database.write_behind import WRITE_BEHIND, WriteKey
+from utils.http.fast_json import FastJSONResponse, parse_date
+from utils.metrics import ISS_REQUEST_SECONDS
 from sql_requests.security_info import (
     GET_SECID_INFO,
+    GET_SECIDS_INFO,
     INSERT_INTO_SECURITY,
     SECURITY_COLUMNS,
 )
 
-router_security_dict = APIRouter()
+router_security_dict = APIRouter(default_response_class=FastJSONResponse)
 
 BOARDS_COLUMNS = ["boardid", "market", "engine", "is_traded", "is_primary", "currencyid"]
 BOARDS_COLUMNS_SET = set(BOARDS_COLUMNS)
@@ -60,11 +65,13 @@ async def security_from_db(attribute, value):
             return {key.upper(): value for key, value in dict(result).items()}
 
 
-@logger.catch
+@ISS_REQUEST_SECONDS.time(endpoint="get_security_by_api")
 async def get_security_by_api(secid: str):
-    async with aiohttp.ClientSession() as client:
-        request = await client.get(settings.POINT_SECURITY_INFO + secid + ".json")
-        return await request.json()
+    try:
+        return await MOEX_CLIENT.get_json(settings.POINT_SECURITY_INFO + secid + ".json")
+    except MoexApiError as error:
+        logger.error("Get security {} from MOEX error: {}", secid, error.message)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=error.message)
 
 
 def get_security_model(data: dict):
@@ -72,51 +79,109 @@ def get_security_model(data: dict):
     return SecurityInfo(**{value[0].upper(): value[2] for value in data["data"]})
 
 
-@logger.catch
-async def save_security(model: SecurityInfo):
-    result = model.dict()
-    values = [result[column] for column in SECURITY_COLUMNS]
-    async with MOEX_DB.pool.acquire() as connect:
-        await connect.execute(INSERT_INTO_SECURITY, *values)
+SECURITY_KEY = WriteKey("security_description", sql=INSERT_INTO_SECURITY)
 
 
-@logger.catch
-async def save_security_boards(data: dict):
-    """Get dictionary by key 'boards' from moex api data"""
-    raw_sql = 'INSERT INTO security_boards (%s) VALUES (%s) ON CONFLICT DO NOTHING' % (
-        ', '.join([f'"{column}"' for column in data["columns"]]),
-        ', '.join([f"${pos}" for pos in range(1, len(data["columns"]) + 1)]),
-    )
+def security_row(model: SecurityInfo) -> list:
+    result = model.dict()
+    return [result[column] for column in SECURITY_COLUMNS]
+
 
+def prepare_boards(data: dict) -> list[list]:
+    """Dates of boards (from moex api data) are converted in place"""
     date_position = [num for num, column in enumerate(data["columns"]) if column in COLUMN_WITH_DATE]
     for values in data["data"]:
         for num in date_position:
             if values[num]:
-                values[num] = datetime.strptime(values[num], "%Y-%m-%d").date()
+                values[num] = parse_date(values[num])
+    return data["data"]
 
-    async with MOEX_DB.pool.acquire() as connect:
-        await connect.executemany(raw_sql, data["data"])
+
+async def save_security_boards(data: dict):
+    """Get dictionary by key 'boards' from moex api data. Saved by write-behind queue"""
+    await WRITE_BEHIND.submit(WriteKey("security_boards", tuple(data["columns"])), prepare_boards(data))
 
 
 async def save_all_result(data: dict, model: SecurityInfo | None = None):
-    """data - json from moex api"""
+    """data - json from moex api. Description and boards are saved by write-behind queue"""
     if not model:
         model = get_security_model(data["description"])
-    tasks = [asyncio.create_task(save_security(model))]
+    await WRITE_BEHIND.submit(SECURITY_KEY, [security_row(model)])
     if "boards" in data and data["boards"].get("data"):
-        tasks.append(asyncio.create_task(save_security_boards(data["boards"])))
-    await asyncio.gather(*tasks)
+        await save_security_boards(data["boards"])
 
 
 async def api_get_and_save_security(secid: str):
     result_api = await get_security_by_api(secid)
     if result_api["description"].get("data"):
         model = get_security_model(result_api["description"])
-        asyncio.create_task(save_all_result(result_api, model))
+        await save_all_result(result_api, model)
         return model
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"details": f"Security {secid} is not found!"})
 
 
+async def load_security(security_id: str, attribute: str):
+    if result := await security_from_db(attribute, security_id):
+        return result
+
+    if attribute != "isin":
+        model = await api_get_and_save_security(security_id)
+        return model
+
+
+class SecuritiesBatchModel(BaseModel):
+    secids: list[str] = Field(min_items=1, max_items=settings.MAX_BATCH_SECURITIES)
+
+
+async def securities_from_db(secids: list[str]) -> dict[str, dict]:
+    async with MOEX_DB.pool.acquire() as connection:
+        records = await connection.fetch(GET_SECIDS_INFO, secids)
+    return {record["secid"]: {key.upper(): value for key, value in record.items()} for record in records}
+
+
+async def security_by_api_limited(secid: str) -> dict:
+    """All batch requests share one limit of concurrent requests to MOEX"""
+    async with SECURITY_REQUEST_SEMAPHORE:
+        return await get_security_by_api(secid)
+
+
+async def save_securities_batch(results: list[tuple[SecurityInfo, dict]]):
+    """Descriptions and boards of all securities - to write-behind queue (written by batches)"""
+    await WRITE_BEHIND.submit(SECURITY_KEY, [security_row(model) for model, _ in results])
+    for _, data in results:
+        if data.get("boards", {}).get("data"):
+            await save_security_boards(data["boards"])
+
+
+@router_security_dict.post("/batch", description="Get info about list of securities", tags=["security"])
+async def get_securities_batch(data: SecuritiesBatchModel):
+    """Known secids - from DB by one query, unknown - from MOEX concurrently (saved by one transaction)"""
+    secids = list(dict.fromkeys(data.secids))
+    found = await securities_from_db(secids)
+    unknown = [secid for secid in secids if secid not in found]
+    responses = await asyncio.gather(*[security_by_api_limited(secid) for secid in unknown], return_exceptions=True)
+
+    loaded, not_found, errors = [], [], {}
+    for secid, response in zip(unknown, responses):
+        if isinstance(response, HTTPException):
+            errors[secid] = response.detail
+        elif isinstance(response, BaseException):
+            raise response
+        elif response["description"].get("data"):
+            model = get_security_model(response["description"])
+            loaded.append((model, response))
+            found[secid] = model.dict()
+        else:
+            not_found.append(secid)
+    if loaded:
+        await save_securities_batch(loaded)
+    return {
+        "securities": [found[secid] for secid in secids if secid in found],
+        "not_found": not_found,
+        "errors": errors,
+    }
+
+
 @router_security_dict.get("/{security_id}", description="Get info about security", tags=["security"])
 async def get_secid(
         security_id: str,
@@ -125,18 +190,20 @@ async def get_secid(
             description="Data from MOEX-api are possible only by 'secid'!"
         ),
 ):
-    if result := await security_from_db(attribute, security_id):
-        return result
-
-    if attribute != "isin":
-        model = await api_get_and_save_security(security_id)
-        return model
+    return await RESPONSE_CACHE.get_or_load(
+        f"security:{attribute}:{security_id}",
+        lambda: load_security(security_id, attribute),
+    )
 
 
 @router_security_dict.get("/boards/{security_id}", description="Get boards by security", tags=["security"])
 async def get_boards_by_secid(
         security_id: str,
 ):
+    return await RESPONSE_CACHE.get_or_load(f"boards:{security_id}", lambda: load_boards(security_id))
+
+
+async def load_boards(security_id: str):
     async with MOEX_DB.pool.acquire() as connect:
         if boards_db := await connect.fetch(SQL_SECURITY_BOARDS, security_id):
             values = []
@@ -149,7 +216,7 @@ async def get_boards_by_secid(
             }
         data_api, data_db = await asyncio.gather(
             get_security_by_api(security_id),
-            connect.fetchrow("SELECT secid FROM security_description WHERE secid=$1", security_id),
+            connect.fetchrow("SELECT secid FROM security_description WHERE secid=$1 AND complete", security_id),
         )
         if not data_api.get("description", {}).get("data"):
             raise HTTPException(
@@ -158,9 +225,9 @@ async def get_boards_by_secid(
             )
 
         if not data_db:
-            asyncio.create_task(save_all_result(data_api))
+            await save_all_result(data_api)
         elif data_api.get("boards", {}).get("data"):
-            asyncio.create_task(save_security_boards(data_api["boards"]))
+            await save_security_boards(data_api["boards"])
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
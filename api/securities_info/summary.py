@@ -0,0 +1,67 @@
+"""
+LATEST QUOTE AND 52 WEEKS SUMMARY BY SECID (security_summary).
+Summary is recalculated for saved secids in the same transaction as history (save_data, market sync),
+so endpoint reads one row by secid without scan of session_security_history.
+Summary of existing history is filled in background on first start; secids without summary row
+are calculated from history on request.
+"""
+from typing import Iterable
+
+from asyncpg import Connection
+from fastapi import APIRouter, HTTPException
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from config import settings
+from db import MOEX_DB
+from sql_requests.security_summary import (
+    raw_sql_calc_security_summary,
+    raw_sql_get_security_summary,
+    raw_sql_lock_security_summary,
+    raw_sql_refresh_security_summary,
+)
+from utils.http.fast_json import FastJSONResponse
+
+router_security_summary = APIRouter(default_response_class=FastJSONResponse)
+
+SQL_HISTORY_SECIDS = "SELECT DISTINCT secid FROM session_security_history"
+SQL_SUMMARY_IS_EMPTY = """
+    SELECT NOT exists(SELECT 1 FROM security_summary) AND exists(SELECT 1 FROM session_security_history)
+"""
+
+
+class SecuritiesSummaryModel(BaseModel):
+    secids: list[str] = Field(min_items=1, max_items=settings.MAX_SUMMARY_SECURITIES)
+
+
+async def refresh_security_summary(connection: Connection, secids: Iterable[str]):
+    """Call in transaction which saves history of secids (advisory locks of secids are held till commit)"""
+    if secids := list(set(secids)):
+        await connection.execute(raw_sql_lock_security_summary, secids)
+        await connection.execute(raw_sql_refresh_security_summary, secids)
+
+
+@logger.catch
+async def fill_security_summary():
+    """Summary of all secids from saved history (first start with summary table: summary is empty)"""
+    async with MOEX_DB.pool.acquire() as connection:
+        if not await connection.fetchval(SQL_SUMMARY_IS_EMPTY):
+            return
+        secids = [row["secid"] for row in await connection.fetch(SQL_HISTORY_SECIDS)]
+        step = settings.MAX_SUMMARY_SECURITIES
+        for start in range(0, len(secids), step):
+            async with connection.transaction():
+                await refresh_security_summary(connection, secids[start:start + step])
+    logger.info("Security summary is filled for {} secids", len(secids))
+
+
+@router_security_summary.post("/summary", description="Last close, 52 weeks high/low and average turnover",
+                              tags=["security"])
+async def get_securities_summary(data: SecuritiesSummaryModel):
+    async with MOEX_DB.pool.acquire() as connection:
+        records = await connection.fetch(raw_sql_get_security_summary, data.secids)
+        if missed := list(set(data.secids) - {record["secid"] for record in records}):
+            records.extend(await connection.fetch(raw_sql_calc_security_summary, missed))
+    if not records:
+        raise HTTPException(status_code=404, detail="Data not found!")
+    return FastJSONResponse({"columns": list(records[0].keys()), "data": [list(row.values()) for row in records]})
@@ -0,0 +1,79 @@
+"""
+BENCHMARK: executemany INSERT vs COPY + merge for session_security_history.
+Uses separate table 'bench_session_security_history' (created from migration and dropped after run).
+
+Run: python -m benchmarks.ingestion --rows 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+
+import asyncpg
+
+from config import settings
+from migrations import security_history
+from utils.database.bulk import copy_upsert, insert_template
+
+BENCH_TABLE = "bench_session_security_history"
+COLUMNS = [
+    "BOARDID", "TRADEDATE", "SHORTNAME", "SECID", "NUMTRADES", "VALUE", "OPEN", "LOW", "HIGH",
+    "LEGALCLOSEPRICE", "WAPRICE", "CLOSE", "VOLUME", "MARKETPRICE2", "MARKETPRICE3", "ADMITTEDQUOTE",
+    "MP2VALTRD", "MARKETPRICE3TRADESVALUE", "ADMITTEDVALUE", "WAVAL", "TRADINGSESSION",
+]
+DAYS_BY_SECURITY = 3000
+
+
+def generate_rows(size: int) -> list[list]:
+    start = date(2015, 1, 1)
+    rows = []
+    for idx in range(size):
+        price = 100 + idx % 97
+        rows.append([
+            "TQBR", start + timedelta(days=idx % DAYS_BY_SECURITY), "BENCH", f"B{idx // DAYS_BY_SECURITY}",
+            idx % 1000, price * 10.0, float(price), price - 1.0, price + 1.0, float(price), float(price),
+            float(price), 10.0, float(price), float(price), float(price), 0.0, 0.0, 0.0, 0.0, 3,
+        ])
+    return rows
+
+
+async def insert_path(connection: asyncpg.Connection, rows: list[list]):
+    async with connection.transaction():
+        await connection.executemany(insert_template(BENCH_TABLE, COLUMNS), rows)
+
+
+async def copy_path(connection: asyncpg.Connection, rows: list[list]):
+    async with connection.transaction():
+        await copy_upsert(connection, BENCH_TABLE, COLUMNS, rows)
+
+
+async def run(sizes: list[int]) -> list[dict]:
+    connection = await asyncpg.connect(dsn=settings.DB_DSN)
+    ddl = (
+        security_history.session_security_history + security_history.session_security_history_partitions
+    ).replace("session_security_history", BENCH_TABLE)
+    results = []
+    try:
+        for size in sizes:
+            rows = generate_rows(size)
+            for name, path in (("executemany", insert_path), ("copy", copy_path)):
+                await connection.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+                await connection.execute(ddl)
+                started = time.perf_counter()
+                await path(connection, rows)
+                seconds = time.perf_counter() - started
+                results.append(
+                    {"path": name, "rows": size, "seconds": round(seconds, 4), "rows_per_second": round(size / seconds)}
+                )
+                print(json.dumps(results[-1]), flush=True)
+    finally:
+        await connection.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        await connection.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion benchmark: executemany vs COPY")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    asyncio.run(run(parser.parse_args().rows))
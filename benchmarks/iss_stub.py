@@ -0,0 +1,269 @@
+"""
+LOCAL STUB OF MOEX ISS for benchmarks: replays ISS-shaped JSON with synthetic data of any size.
+Endpoints: dictionaries (index, handbook), security description + boards, day history + history.cursor,
+market day history (all securities by date) and securities listing.
+Latency and errors can be injected (--latency, --error-rate).
+
+Run: python -m benchmarks.iss_stub --port 8089 --days 3000 --boards 2 --latency 0.05
+Then set POINT_* in .env to http://127.0.0.1:8089/iss/...
+"""
+import argparse
+import asyncio
+import random
+import zlib
+from datetime import date, timedelta
+
+from aiohttp import web
+
+PAGE_SIZE = 100
+START_DATE = date(2015, 1, 1)
+ENGINE, MARKET, SESSION = "stock", "shares", 3
+BOARDS = ["TQBR", "SMAL", "SPEQ", "TQDE"]
+
+HISTORY_COLUMNS = [
+    "BOARDID", "TRADEDATE", "SHORTNAME", "SECID", "NUMTRADES", "VALUE", "OPEN", "LOW", "HIGH",
+    "LEGALCLOSEPRICE", "WAPRICE", "CLOSE", "VOLUME", "MARKETPRICE2", "MARKETPRICE3", "ADMITTEDQUOTE",
+    "MP2VALTRD", "MARKETPRICE3TRADESVALUE", "ADMITTEDVALUE", "WAVAL", "TRADINGSESSION",
+]
+CURSOR_COLUMNS = ["INDEX", "TOTAL", "PAGESIZE"]
+DESCRIPTION_COLUMNS = ["name", "title", "value", "type", "sort_order", "is_hidden", "precision"]
+LISTING_COLUMNS = [
+    "id", "secid", "shortname", "regnumber", "name", "isin", "is_traded", "emitent_id", "emitent_title",
+    "emitent_inn", "emitent_okpo", "gosreg", "type", "group", "primary_boardid", "marketprice_boardid",
+]
+SECURITY_BOARDS_COLUMNS = [
+    "secid", "boardid", "title", "board_group_id", "market_id", "market", "engine_id", "engine", "is_traded",
+    "decimals", "history_from", "history_till", "listed_from", "listed_till", "is_primary", "currencyid",
+]
+
+# MINIMAL CONSISTENT DICTIONARIES (columns as in migrations/market_types.py)
+DICTIONARIES = {
+    "engines": {"columns": ["id", "name", "title"], "data": [[1, ENGINE, "Фондовый рынок"]]},
+    "markets": {
+        "columns": [
+            "id", "trade_engine_id", "trade_engine_name", "trade_engine_title", "market_name", "market_title",
+            "market_id", "marketplace", "is_otc", "has_history_files", "has_history_trades_files", "has_trades",
+            "has_history", "has_candles", "has_orderbook", "has_tradingsession", "has_extra_yields", "has_delay",
+        ],
+        "data": [[1, 1, ENGINE, "Фондовый рынок", MARKET, "Акции", 1, "MXSE", 0, 1, 1, 1, 1, 1, 1, 1, 0, 0]],
+    },
+    "boardgroups": {
+        "columns": [
+            "id", "trade_engine_id", "trade_engine_name", "trade_engine_title", "market_id", "market_name", "name",
+            "title", "is_default", "board_group_id", "is_traded", "is_order_driven", "category",
+        ],
+        "data": [[57, 1, ENGINE, "Фондовый рынок", 1, MARKET, "stock_tplus", "Т+", 1, 57, 1, 1, "stock"]],
+    },
+    "boards": {
+        "columns": [
+            "id", "board_group_id", "engine_id", "market_id", "boardid", "board_title", "is_traded", "has_candles",
+            "is_primary",
+        ],
+        "data": [[idx, 57, 1, 1, board, board, 1, 1, int(idx == 1)] for idx, board in enumerate(BOARDS, start=1)],
+    },
+    "durations": {
+        "columns": ["interval", "duration", "days", "title", "hint"],
+        "data": [[1, 60, None, "минута", "1м"], [24, 86400, 1, "день", "1д"]],
+    },
+    "securitytypes": {
+        "columns": [
+            "id", "trade_engine_id", "trade_engine_name", "trade_engine_title", "security_type_name",
+            "security_type_title", "security_group_name", "stock_type",
+        ],
+        "data": [[3, 1, ENGINE, "Фондовый рынок", "common_share", "Акция обыкновенная", "stock_shares", "1"]],
+    },
+    "securitygroups": {"columns": ["id", "name", "title", "is_hidden"], "data": [[4, "stock_shares", "Акции", 0]]},
+    "securitycollections": {
+        "columns": ["id", "name", "title", "security_group_id"],
+        "data": [[3, "stock_shares_all", "Все акции", 4]],
+    },
+}
+HANDBOOK = {"columns": ["slug", "title"], "data": [["stock", "Фондовый рынок"]]}
+
+
+def trading_days(start: date, end: date) -> list[date]:
+    days, day = [], start
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+class IssStub:
+    """Synthetic data is deterministic by secid: 'boards' boards for every weekday from START_DATE ('days' days).
+    Market (history by date, listing) has 'securities' securities: BM00000, BM00001..."""
+
+    def __init__(
+            self,
+            days: int = 3000,
+            boards: int = 1,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            securities: int = 300,
+    ):
+        self.days = days
+        self.market_secids = [f"BM{idx:05d}" for idx in range(securities)]
+        self.boards = BOARDS[:max(1, min(boards, len(BOARDS)))]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._runner: web.AppRunner | None = None
+
+    def application(self) -> web.Application:
+        app = web.Application(middlewares=[self.inject])
+        app.router.add_get("/iss/index.json", self.index)
+        app.router.add_get("/iss/index/handbooks/boardgroups_category.json", self.handbook)
+        app.router.add_get("/iss/securities/{secid}.json", self.security)
+        app.router.add_get(
+            "/iss/history/engines/{engine}/markets/{market}/sessions/{session}/securities/{secid}.json", self.history
+        )
+        app.router.add_get(
+            "/iss/history/engines/{engine}/markets/{market}/sessions/{session}/securities.json", self.market_history
+        )
+        app.router.add_get("/iss/securities.json", self.listing)
+        return app
+
+    @web.middleware
+    async def inject(self, request: web.Request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(random.expovariate(1 / self.latency))
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            status = random.choice((429, 500, 503))
+            return web.Response(status=status, headers={"Retry-After": "0"} if status == 429 else None)
+        return await handler(request)
+
+    @staticmethod
+    async def index(_: web.Request) -> web.Response:
+        return web.json_response(DICTIONARIES)
+
+    @staticmethod
+    async def handbook(_: web.Request) -> web.Response:
+        return web.json_response({"handbooks_handbook": HANDBOOK})
+
+    def security_rows(self, secid: str) -> tuple[list, list]:
+        description = [
+            ["SECID", "Код ценной бумаги", secid, "string", 1, 0, None],
+            ["NAME", "Полное наименование", f"Benchmark {secid}", "string", 2, 0, None],
+            ["SHORTNAME", "Краткое наименование", secid, "string", 3, 0, None],
+            ["ISIN", "ISIN код", f"RU{zlib.crc32(secid.encode()):010d}", "string", 4, 0, None],
+            ["ISSUESIZE", "Объем выпуска", "1000000", "number", 5, 0, None],
+            ["FACEVALUE", "Номинальная стоимость", "1", "number", 6, 0, 2],
+            ["TYPE", "Тип бумаги", "common_share", "string", 7, 0, None],
+            ["GROUP", "Код типа инструмента", "stock_shares", "string", 8, 0, None],
+        ]
+        end = START_DATE + timedelta(days=self.days)
+        boards = [
+            [secid, board, board, 57, 1, MARKET, 1, ENGINE, 1, 2, str(START_DATE), str(end), None, None,
+             int(idx == 0), "RUB"]
+            for idx, board in enumerate(self.boards)
+        ]
+        return description, boards
+
+    async def security(self, request: web.Request) -> web.Response:
+        secid = request.match_info["secid"]
+        description, boards = self.security_rows(secid)
+        return web.json_response({
+            "description": {"columns": DESCRIPTION_COLUMNS, "data": description},
+            "boards": {"columns": SECURITY_BOARDS_COLUMNS, "data": boards},
+        })
+
+    def history_rows(self, secid: str, start: date, end: date) -> list[list]:
+        end = min(end, START_DATE + timedelta(days=self.days - 1))
+        rows = []
+        for day in trading_days(max(start, START_DATE), end):
+            price = 100 + (day.toordinal() + len(secid)) % 97
+            for board in self.boards:
+                rows.append([
+                    board, str(day), secid, secid, 1000, price * 1000.0, float(price), price - 1.0, price + 1.0,
+                    float(price), float(price), float(price), 1000.0, float(price), float(price), float(price),
+                    0.0, 0.0, 0.0, 0.0, SESSION,
+                ])
+        return rows
+
+    async def history(self, request: web.Request) -> web.Response:
+        params = request.query
+        start = int(params.get("start", 0))
+        rows = self.history_rows(
+            request.match_info["secid"],
+            date.fromisoformat(params.get("from", str(START_DATE))),
+            date.fromisoformat(params.get("till", str(date.today()))),
+        )
+        return web.json_response({
+            "history": {"columns": HISTORY_COLUMNS, "data": rows[start:start + PAGE_SIZE]},
+            "history.cursor": {"columns": CURSOR_COLUMNS, "data": [[start, len(rows), PAGE_SIZE]]},
+        })
+
+    async def market_history(self, request: web.Request) -> web.Response:
+        """All securities of market by date (ISS: ?date=&start=)"""
+        params = request.query
+        start = int(params.get("start", 0))
+        day = date.fromisoformat(params["date"])
+        rows = [row for secid in self.market_secids for row in self.history_rows(secid, day, day)]
+        return web.json_response({
+            "history": {"columns": HISTORY_COLUMNS, "data": rows[start:start + PAGE_SIZE]},
+            "history.cursor": {"columns": CURSOR_COLUMNS, "data": [[start, len(rows), PAGE_SIZE]]},
+        })
+
+    async def listing(self, request: web.Request) -> web.Response:
+        """Securities listing (ISS: ?start=, pages of PAGE_SIZE without cursor)"""
+        start = int(request.query.get("start", 0))
+        rows = [
+            [idx, secid, secid, None, f"Benchmark {secid}", f"RU{zlib.crc32(secid.encode()):010d}", 1, idx,
+             f"Emitent {secid}", None, None, None, "common_share", "stock_shares", self.boards[0], self.boards[0]]
+            for idx, secid in enumerate(self.market_secids[start:start + PAGE_SIZE], start=start)
+        ]
+        return web.json_response({"securities": {"columns": LISTING_COLUMNS, "data": rows}})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8089):
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def stub_points(base_url: str) -> dict[str, str]:
+    """Settings (env variables) to point application to stub"""
+    iss = base_url.rstrip("/") + "/iss/"
+    return {
+        "POINT_MARKET_DICTIONARY": iss + "index.json",
+        "POINT_HANDBOOK": iss + "index/handbooks/boardgroups_category.json",
+        "POINT_SECURITY_INFO": iss + "securities/",
+        "POINT_SECURITY_DAY_HISTORY": (
+            iss + "history/engines/{engine}/markets/{market}/sessions/{session}/securities/{secid}.json"
+        ),
+        "POINT_MARKET_DAY_HISTORY": iss + "history/engines/{engine}/markets/{market}/sessions/{session}/securities.json",
+        "POINT_SECURITIES_LIST": iss + "securities.json",
+    }
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--days", type=int, default=3000, help="Calendar days of history by security")
+    parser.add_argument("--boards", type=int, default=1, help="Boards by security (rows by day)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean latency of response (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part of responses with 429/5xx")
+    parser.add_argument("--market-securities", type=int, default=300, help="Securities of market history and listing")
+
+
+async def serve(args: argparse.Namespace):
+    stub = IssStub(args.days, args.boards, args.latency, args.error_rate, args.market_securities)
+    await stub.start(port=args.port)
+    print(f"ISS stub on http://127.0.0.1:{args.port}/iss/", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of MOEX ISS")
+    add_stub_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,29 @@
+"""
+SUMMARY OF BENCHMARK LATENCIES (shared by benchmarks and workers with --benchmark).
+"""
+import json
+import math
+
+
+def percentile(latencies: list[float], value: float) -> float | None:
+    """Nearest rank percentile of sorted latencies"""
+    if not latencies:
+        return None
+    return latencies[min(len(latencies) - 1, max(math.ceil(value / 100 * len(latencies)) - 1, 0))]
+
+
+def summary(name: str, latencies: list[float], seconds: float, **extra) -> dict:
+    """Latencies in milliseconds, throughput - requests by second. Result is printed as JSON line"""
+    latencies = sorted(latencies)
+    result = {
+        "scenario": name,
+        "requests": len(latencies),
+        "seconds": round(seconds, 4),
+        "throughput": round(len(latencies) / seconds, 2) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+    result.update(extra)
+    print(json.dumps(result), flush=True)
+    return result
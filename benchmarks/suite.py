@@ -0,0 +1,241 @@
+"""
+BENCHMARK SUITE: application against local ISS stub (benchmarks/iss_stub.py) and temporary Postgres database.
+Database '<name of DB_DSN>_bench' is created for run and dropped after (--keep-db to keep it),
+so dictionaries and history of main database are not touched.
+
+Scenarios:
+    history      - POST /history/security_by_days: cold (loading from ISS) and warm (from DB) throughput, p50/p99
+    save_data    - WorkWithDayHistory.save_data ingest rate
+    check_values - check_default_values overhead (dictionary cache and DB path)
+    security     - GET /security/{id} cold (ISS + save) and warm (response cache)
+    market_sync  - MarketHistorySync ingest rate of market history by dates (--sync-days)
+    preload      - SecuritiesPreload of securities listing (--market-securities)
+
+Result - JSON lines in stdout and JSON report (--output) for tracking regressions between releases.
+Run: python -m benchmarks.suite --securities 50 --concurrency 10 --output bench_result.json
+Baseline (default parameters, local Postgres 18 and stub): benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit
+
+import asyncpg
+import httpx
+
+from benchmarks.iss_stub import ENGINE, MARKET, SESSION, START_DATE, IssStub, add_stub_arguments, stub_points
+from benchmarks.stats import summary
+from config import settings
+
+SCENARIOS = ("history", "save_data", "check_values", "security", "market_sync", "preload")
+
+
+async def measure(calls: list, concurrency: int) -> tuple[list[float], float, int]:
+    """Run coroutine functions with concurrency limit. Return latencies, total time and count of errors"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def call(function):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await function()
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[call(function) for function in calls])
+    return latencies, time.perf_counter() - started, errors
+
+
+async def checked(request) -> httpx.Response:
+    """Error status is counted as error of request"""
+    response = await request
+    response.raise_for_status()
+    return response
+
+
+@asynccontextmanager
+async def bench_database(dsn: str, keep: bool = False):
+    """Temporary database near database of 'dsn'. Yield dsn of temporary database"""
+    parts = urlsplit(dsn)
+    name = parts.path.lstrip("/") + "_bench"
+    bench_dsn = urlunsplit(parts._replace(path="/" + name))
+    connection = await asyncpg.connect(dsn=dsn)
+    try:
+        await connection.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        await connection.execute(f'CREATE DATABASE "{name}"')
+        yield bench_dsn
+    finally:
+        if not keep:
+            await connection.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        await connection.close()
+
+
+def history_payload(secid: str, days: int) -> dict:
+    return {
+        "engine": ENGINE,
+        "market": MARKET,
+        "session": SESSION,
+        "secid": secid,
+        "start_date": str(START_DATE),
+        "end_date": str(min(START_DATE + timedelta(days=days - 1), date.today())),
+    }
+
+
+async def history_scenario(client: httpx.AsyncClient, args) -> list[dict]:
+    secids = [f"BH{idx:05d}" for idx in range(args.securities)]
+    results = []
+    for phase in ("cold", "warm"):
+        calls = [
+            lambda secid=secid: checked(
+                client.post("/history/security_by_days", json=history_payload(secid, args.days))
+            )
+            for secid in secids
+        ]
+        latencies, seconds, errors = await measure(calls, args.concurrency)
+        results.append(summary(f"history_{phase}", latencies, seconds, errors=errors, days=args.days))
+    return results
+
+
+async def save_data_scenario(_: httpx.AsyncClient, args) -> list[dict]:
+    from api.history.day_aggregation import SecurityDayHistoryModel, WorkWithDayHistory
+    from benchmarks.iss_stub import HISTORY_COLUMNS
+
+    stub = IssStub(days=args.days, boards=args.boards)
+    results = []
+    for idx in range(args.repeat):
+        secid = f"BS{idx:05d}"
+        request = SecurityDayHistoryModel(**history_payload(secid, args.days))
+        worker = WorkWithDayHistory(request)
+        worker.columns = HISTORY_COLUMNS
+        worker.trade_date_index = HISTORY_COLUMNS.index(worker.TRADE_DATE_COLUMN)
+        rows = stub.history_rows(secid, START_DATE, START_DATE + timedelta(days=args.days))
+        worker.date_str_to_date(rows)
+        wait_id = await worker.save_wait_transaction(request.start_date, request.end_date)
+        started = time.perf_counter()
+        await worker.save_data(wait_id, rows)
+        seconds = time.perf_counter() - started
+        results.append({"rows": len(rows), "seconds": seconds})
+    rows = sum(result["rows"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    return [summary(
+        "save_data", [result["seconds"] for result in results], seconds, rows=rows, rows_per_second=round(rows / seconds)
+    )]
+
+
+async def check_values_scenario(_: httpx.AsyncClient, args) -> list[dict]:
+    from api.history.day_aggregation import SecurityHistoryKeyModel
+    from utils.cache.dictionaries import DICTIONARY_CACHE
+    from utils.validators.secid_and_market import check_default_values
+
+    model = SecurityHistoryKeyModel(engine=ENGINE, market=MARKET, session=SESSION, secid="BH00000")
+    await check_default_values(model)  # SECURITY IS SAVED IN DB
+    await asyncio.sleep(0.5)
+    results = []
+    for phase in ("cache", "db"):
+        if phase == "db":
+            DICTIONARY_CACHE.invalidate()
+        calls = [lambda: check_default_values(model)] * args.repeat
+        latencies, seconds, errors = await measure(calls, 1)
+        results.append(summary(f"check_values_{phase}", latencies, seconds, errors=errors))
+    await DICTIONARY_CACHE.reload()
+    return results
+
+
+async def security_scenario(client: httpx.AsyncClient, args) -> list[dict]:
+    secids = [f"BD{idx:05d}" for idx in range(args.securities)]
+    results = []
+    for phase in ("cold", "warm"):
+        calls = [lambda secid=secid: checked(client.get(f"/security/{secid}")) for secid in secids]
+        latencies, seconds, errors = await measure(calls, args.concurrency)
+        results.append(summary(f"security_{phase}", latencies, seconds, errors=errors))
+    return results
+
+
+async def market_sync_scenario(_: httpx.AsyncClient, args) -> list[dict]:
+    from workers.history_sync import MarketHistorySync
+
+    end_date = START_DATE + timedelta(days=args.sync_days - 1)
+    started = time.perf_counter()
+    rows = await MarketHistorySync(ENGINE, MARKET).run(START_DATE, end_date)
+    seconds = time.perf_counter() - started
+    return [summary("market_sync", [seconds], seconds, rows=rows, rows_per_second=round(rows / seconds))]
+
+
+async def preload_scenario(_: httpx.AsyncClient, args) -> list[dict]:
+    from workers.securities_preload import SecuritiesPreload
+
+    started = time.perf_counter()
+    rows = await SecuritiesPreload().run()
+    seconds = time.perf_counter() - started
+    return [summary("preload", [seconds], seconds, rows=rows, rows_per_second=round(rows / seconds))]
+
+
+def revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> dict:
+    stub = IssStub(args.days, args.boards, args.latency, args.error_rate, args.market_securities)
+    await stub.start(port=args.port)
+    report = {
+        "revision": revision(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": [],
+    }
+    try:
+        async with bench_database(settings.DB_DSN, args.keep_db) as dsn:
+            # SETTINGS BEFORE IMPORT OF APPLICATION (GLOBAL CLIENT, POOLS)
+            overrides = stub_points(f"http://127.0.0.1:{args.port}")
+            overrides.update(DB_DSN=dsn, MOEX_RATE_LIMIT=args.rate_limit, HISTORY_SYNC_ENABLED=False)
+            for key, value in overrides.items():
+                setattr(settings, key, value)
+            from main import app
+
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                    scenarios = {
+                        "history": history_scenario,
+                        "save_data": save_data_scenario,
+                        "check_values": check_values_scenario,
+                        "security": security_scenario,
+                        "market_sync": market_sync_scenario,
+                        "preload": preload_scenario,
+                    }
+                    for name in args.scenarios:
+                        report["results"].extend(await scenarios[name](client, args))
+    finally:
+        await stub.stop()
+    report["stub"] = {"requests": stub.requests, "errors": stub.errors}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of application with local ISS stub")
+    add_stub_arguments(parser)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--securities", type=int, default=20, help="Securities (requests) for http scenarios")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations for save_data and check_values")
+    parser.add_argument("--sync-days", type=int, default=30, help="Calendar days for market_sync")
+    parser.add_argument("--rate-limit", type=float, default=1000, help="MOEX_RATE_LIMIT (stub is not limited)")
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--output", help="File for JSON report")
+    asyncio.run(run(parser.parse_args()))
@@ -6,6 +6,16 @@ class Settings(BaseSettings):
     DEBUG_LEVEL: str = "DEBUG"
     MAX_PROCESS: int = 4
     MAX_ASYNC_REQUEST_WORKER: int = 5
+    MAX_ASYNC_SECURITY_WORKER: int = 10
+    MAX_BATCH_SECURITIES: int = 500
+    MAX_BATCH_HISTORY_WORKER: int = 10
+    HISTORY_WAIT_TIMEOUT: float = 30
+    HISTORY_WAIT_RECHECK: float = 5
+    COVERAGE_CACHE_MAX_KEYS: int = 100_000
+    HISTORY_STREAM_CHUNK_SIZE: int = 1000
+    HISTORY_PAGE_SIZE: int = 100  # PAGE SIZE OF ISS HISTORY
+    HISTORY_PREFETCH_MAX_PAGES: int = 10
+    HISTORY_SPLIT_DAYS: int = 365
 
     # DB
     DB_DSN: str
@@ -14,11 +24,81 @@ class Settings(BaseSettings):
     MIN_POOL_SIZE_PROCESS: int = 2
     MAX_POOL_SIZE_PROCESS: int = 5
 
+    # SEARCH
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.3
+    SEARCH_MIN_TRIGRAM_LENGTH: int = 3  # SHORTER QUERIES - IN-MEMORY PREFIX INDEX
+    SEARCH_PAGE_SIZE: int = 20
+    SEARCH_CACHE_MAX_SIZE: int = 10_000
+    SEARCH_CACHE_TTL: int = 300
+    SEARCH_INDEX_TTL: int = 600
+
+    # SUMMARY
+    MAX_SUMMARY_SECURITIES: int = 5000
+
+    # DICTIONARIES
+    DICTIONARY_REFRESH_INTERVAL: int = 7 * 24 * 60 * 60
+
+    # ANALYTICS
+    ANALYTICS_MAX_SECURITIES: int = 200
+    ANALYTICS_PROCESS_MIN_SIZE: int = 50_000  # secids * days for calculation in process pool
+
+    # INGESTION
+    INGESTION_MODE: str = "copy"  # copy / insert
+    INGESTION_COPY_MIN_ROWS: int = 200
+
+    # MOEX CLIENT
+    MOEX_CONNECTION_LIMIT: int = 100
+    MOEX_CONNECTION_LIMIT_PER_HOST: int = 20
+    MOEX_DNS_CACHE_TTL: int = 300
+    MOEX_KEEPALIVE_TIMEOUT: float = 30
+    MOEX_TOTAL_TIMEOUT: float = 60
+    MOEX_CONNECT_TIMEOUT: float = 10
+    MOEX_READ_TIMEOUT: float = 30
+    MOEX_RATE_LIMIT: float = 20  # requests per second (max for adaptive throttle)
+    MOEX_RATE_MIN: float = 1
+    MOEX_RATE_BURST: int = 10
+    MOEX_SLOW_RESPONSE: float = 5
+    MOEX_RETRY_ATTEMPTS: int = 4
+    MOEX_RETRY_BUDGET: float = 30
+    MOEX_RETRY_BASE_DELAY: float = 0.5
+    MOEX_RETRY_MAX_DELAY: float = 10
+    MOEX_BREAKER_FAILURES: int = 5
+    MOEX_BREAKER_RESET: float = 30
+
+    # CACHE
+    CACHE_BACKEND: str = "memory"  # memory / redis
+    REDIS_DSN: str | None = None
+    CACHE_TTL: int = 3600
+    CACHE_NEGATIVE_TTL: int = 300
+    CACHE_MEMORY_MAX_SIZE: int = 10_000
+
     # POINTS
     POINT_MARKET_DICTIONARY: str
     POINT_HANDBOOK: str
     POINT_SECURITY_INFO: str
     POINT_SECURITY_DAY_HISTORY: str
+    POINT_MARKET_DAY_HISTORY: str = (
+        "https://iss.moex.com/iss/history/engines/{engine}/markets/{market}/sessions/{session}/securities.json"
+    )
+    POINT_SECURITIES_LIST: str = "https://iss.moex.com/iss/securities.json"
+
+    # FULL MARKET HISTORY SYNC
+    HISTORY_SYNC_ENABLED: bool = False
+    HISTORY_SYNC_MARKETS: str = "stock/shares"  # engine/market separated by comma
+    HISTORY_SYNC_START_DATE: str = "2015-01-01"
+    HISTORY_SYNC_INTERVAL: int = 6 * 60 * 60
+    HISTORY_SYNC_MAX_REQUESTS: int = 5
+
+    # SECURITIES LISTING PRELOAD
+    SECURITIES_PRELOAD_ENABLED: bool = False
+    SECURITIES_PRELOAD_INTERVAL: int = 24 * 60 * 60
+    SECURITIES_PRELOAD_PAGES: int = 5  # PAGES REQUESTED CONCURRENTLY (AND SAVED BY ONE TRANSACTION)
+    SECURITIES_PRELOAD_ONLY_TRADED: bool = True
+
+    # WRITE-BEHIND (BACKGROUND SAVES BY BATCHES)
+    WRITE_BEHIND_BATCH_SIZE: int = 1000
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.5
+    WRITE_BEHIND_RETRIES: int = 3
 
     # QUERY
     QUEUE_THREAD_MAX_SIZE: int = 10_000
@@ -33,3 +113,4 @@ settings = Settings(_env_file=r'C:\projects\moex_fast_utils\.env')
 QUEUE_THREAD = asyncio.Queue(maxsize=settings.QUEUE_THREAD_MAX_SIZE)
 QUEUE_PROCESS = asyncio.Queue(maxsize=settings.QUEUE_PROCESS_MAX_SIZE)
 REQUEST_SEMAPHORE = asyncio.Semaphore(settings.MAX_ASYNC_REQUEST_WORKER)  # USE FOR HISTORY DATA
+SECURITY_REQUEST_SEMAPHORE = asyncio.Semaphore(settings.MAX_ASYNC_SECURITY_WORKER)  # USE FOR BATCH OF SECURITIES
@@ -1,15 +1,76 @@
 import asyncio
+import time
 
 import asyncpg
 from asyncpg.pool import Pool
 from contextlib import asynccontextmanager
 from config import settings
 from utils import singleton
+from utils.metrics import DB_ACQUIRE_SECONDS, DB_QUERY_SECONDS
+
+
+class InstrumentedConnection(asyncpg.Connection):
+    """Connection with time of queries in metrics (by method)"""
+
+    async def execute(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(method="execute"):
+            return await super().execute(*args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(method="executemany"):
+            return await super().executemany(*args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(method="fetch"):
+            return await super().fetch(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(method="fetchrow"):
+            return await super().fetchrow(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(method="fetchval"):
+            return await super().fetchval(*args, **kwargs)
+
+    async def copy_records_to_table(self, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(method="copy_records_to_table"):
+            return await super().copy_records_to_table(*args, **kwargs)
+
+
+class TimedAcquire:
+    """pool.acquire() with wait time of connection in metrics"""
+
+    def __init__(self, context):
+        self._context = context
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        try:
+            return await self._context.__aenter__()
+        finally:
+            DB_ACQUIRE_SECONDS.observe(time.perf_counter() - start)
+
+    async def __aexit__(self, *exc):
+        return await self._context.__aexit__(*exc)
+
+
+class InstrumentedPool:
+    """Proxy of asyncpg pool: acquire is measured, other attributes are from pool"""
+
+    def __init__(self, pool: Pool):
+        self._pool = pool
+
+    def acquire(self, *, timeout=None) -> TimedAcquire:
+        return TimedAcquire(self._pool.acquire(timeout=timeout))
+
+    def __getattr__(self, item):
+        return getattr(self._pool, item)
 
 
 @singleton
 class DataBase:
     _pool: Pool = None
+    _instrumented: InstrumentedPool = None
 
     async def create_pool(self):
         if not self._pool:
@@ -17,11 +78,13 @@ class DataBase:
                 dsn=settings.DB_DSN,
                 min_size=settings.MIN_POOL_SIZE,
                 max_size=settings.MAX_POOL_SIZE,
+                connection_class=InstrumentedConnection,
             )
+            self._instrumented = InstrumentedPool(self._pool)
 
     @property
     def pool(self):
-        return self._pool
+        return self._instrumented if self._pool else None
 
     def __del__(self):
         try:
@@ -30,13 +93,17 @@ class DataBase:
         except Exception:
             pass
 
-@asynccontextmanager
-async def pool_for_process():
-    pool = await asyncpg.create_pool(
+async def create_process_pool() -> Pool:
+    return await asyncpg.create_pool(
         dsn=settings.DB_DSN,
         min_size=settings.MIN_POOL_SIZE_PROCESS,
         max_size=settings.MAX_POOL_SIZE_PROCESS
     )
+
+
+@asynccontextmanager
+async def pool_for_process():
+    pool = await create_process_pool()
     try:
         yield pool
     finally:
@@ -1,4 +1,5 @@
 import asyncio
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
@@ -7,10 +8,19 @@ from loguru import logger
 
 from config import settings
 from db import MOEX_DB
+from moex_client import MOEX_CLIENT
+from utils.cache.responses import RESPONSE_CACHE
+from api.analytics.statistics import router_analytics
+from api.metrics.exposition import router_metrics
 from api.securities_info.security_dict import router_security_dict
+from api.securities_info.search import router_security_search
+from api.securities_info.summary import router_security_summary, fill_security_summary
 from api.history.day_aggregation import router_security_history
+from api.history.trading_calendar import TRADING_CALENDAR
+from api.history.waiters import HISTORY_WAITERS
+from utils.database.write_behind import WRITE_BEHIND
 from utils.database.prepare import prepare_database, get_dictionaries_from_moex, del_await_history_from_api
-from workers import process_workers
+from workers import history_sync_scheduler, process_workers, securities_preload_scheduler
 
 
 logger.remove()
@@ -25,23 +35,42 @@ logger.add(
 )
 logger.add(sys.stderr, level="INFO")
 
-app = FastAPI()
-app.include_router(router_security_dict, prefix="/security")
-app.include_router(router_security_history, prefix="/history")
-
 
-@app.on_event("startup")
-async def startup_settings():
+@asynccontextmanager
+async def lifespan(_: FastAPI):
     await MOEX_DB.create_pool()  # CREATE GLOBAL DB POOL
+    await MOEX_CLIENT.create_session()  # CREATE GLOBAL MOEX HTTP CLIENT
+    await RESPONSE_CACHE.connect()  # REDIS OR MEMORY CACHE FOR RESPONSES
     await prepare_database()  # CREATE DB IF NOT EXISTS
+    WRITE_BEHIND.start()  # BACKGROUND SAVES (SECURITIES, BOARDS) BY BATCHES
+    WRITE_BEHIND.spawn(fill_security_summary())  # NEW SUMMARY TABLE: FILL FROM SAVED HISTORY (BACKGROUND)
+    await HISTORY_WAITERS.start()  # LISTEN LOADED HISTORY FROM OTHER PROCESSES
     await get_dictionaries_from_moex()  # UPDATE DICTIONARIES
-    asyncio.create_task(process_workers())
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
+    await TRADING_CALENDAR.load()  # TRADING DAYS BY MARKETS IN MEMORY
+    process_workers_task = asyncio.create_task(process_workers())
+    history_sync_task = asyncio.create_task(history_sync_scheduler()) if settings.HISTORY_SYNC_ENABLED else None
+    preload_task = asyncio.create_task(securities_preload_scheduler()) if settings.SECURITIES_PRELOAD_ENABLED else None
+    yield
+    for task in (history_sync_task, preload_task):
+        if task:
+            task.cancel()
+    process_workers_task.cancel()
+    await asyncio.gather(process_workers_task, return_exceptions=True)
+    await WRITE_BEHIND.stop()  # DRAIN QUEUE: ACCEPTED SAVES ARE NOT LOST
     await asyncio.sleep(10)
     await del_await_history_from_api()
+    await HISTORY_WAITERS.stop()
+    await MOEX_CLIENT.close()
+    await RESPONSE_CACHE.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(router_security_search, prefix="/security")  # BEFORE "/security/{security_id}"
+app.include_router(router_security_summary, prefix="/security")
+app.include_router(router_security_dict, prefix="/security")
+app.include_router(router_security_history, prefix="/history")
+app.include_router(router_analytics, prefix="/analytics")
+app.include_router(router_metrics, prefix="/metrics")
 
 
 if __name__ == "__main__":
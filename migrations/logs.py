@@ -18,7 +18,49 @@ CREATE TABLE IF NOT EXISTS logs_session_security_history(
     status log_status NOT NULL,
     PRIMARY KEY (id),
     CHECK (start_date <= end_date),
-    CHECK (end_date - start_date <= 3000),
     UNIQUE (engine, market, session, secid, start_date, end_date)
 );
-"""
\ No newline at end of file
+"""
+
+# Run on every start (idempotent): coverage as daterange with GiST index. Merged intervals can be > 3000 days.
+logs_session_security_history_coverage = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE logs_session_security_history
+    ADD COLUMN IF NOT EXISTS period daterange GENERATED ALWAYS AS (daterange(start_date, end_date, '[]')) STORED;
+CREATE INDEX IF NOT EXISTS logs_session_security_history_period_idx ON logs_session_security_history
+    USING gist (secid, engine, market, session, period);
+DO $$
+DECLARE
+    constraint_name text;
+BEGIN
+    FOR constraint_name IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'logs_session_security_history'::regclass
+          AND contype = 'c'
+          AND pg_get_constraintdef(oid) LIKE '%3000%'
+    LOOP
+        EXECUTE format('ALTER TABLE logs_session_security_history DROP CONSTRAINT %I', constraint_name);
+    END LOOP;
+END $$;
+"""
+
+sync_session_security_history = """
+CREATE TABLE IF NOT EXISTS sync_session_security_history(
+    engine varchar(45) NOT NULL,
+    market  varchar(45) NOT NULL,
+    session smallint NOT NULL default 3,
+    last_date date NOT NULL,
+    update_date timestamp default current_timestamp,
+    PRIMARY KEY (engine, market, session)
+);
+"""
+
+
+dictionary_refresh = """
+CREATE TABLE IF NOT EXISTS dictionary_refresh(
+    name varchar(45) NOT NULL,
+    content_hash varchar(64) NOT NULL,
+    refresh_date timestamp NOT NULL default current_timestamp,
+    PRIMARY KEY (name)
+);
+"""
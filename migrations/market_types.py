@@ -15,6 +15,19 @@ create_table_order = [
     "securitycollections",
 ]
 
+# Primary keys of dictionaries (for incremental refresh)
+primary_keys = {
+    "handbook": "slug",
+    "engines": "id",
+    "markets": "id",
+    "boardgroups": "id",
+    "boards": "id",
+    "durations": "interval",
+    "securitygroups": "id",
+    "securitytypes": "id",
+    "securitycollections": "id",
+}
+
 engines = """
 CREATE TABLE IF NOT EXISTS engines (
     id integer NOT NULL,
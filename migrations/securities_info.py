@@ -21,6 +21,7 @@ CREATE TABLE IF NOT EXISTS security_description (
     "TYPE" varchar(100) NULL,
     GROUPNAME varchar(100) NULL,
     EMITTER_ID varchar(200) NULL,
+    COMPLETE boolean NOT NULL default true,
     PRIMARY KEY (SECID)
 );
 CREATE INDEX IF NOT EXISTS security_description_idx ON security_description 
@@ -50,4 +51,16 @@ CREATE TABLE IF NOT EXISTS security_boards (
 CREATE INDEX IF NOT EXISTS security_boards_idx ON security_boards (
     secid, boardid, market, engine, is_traded, is_primary
 );
-"""
\ No newline at end of file
+"""
+# Run on every start (idempotent): prefix search (LIKE 'ABC%') by SECID for search endpoint
+security_description_search = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS security_description_secid_pattern_idx ON security_description
+    (SECID varchar_pattern_ops);
+"""
+
+# Run on every start (idempotent): rows of securities listing preload are partial (COMPLETE = false),
+# they are completed by description from ISS on first request
+security_description_complete = """
+ALTER TABLE security_description ADD COLUMN IF NOT EXISTS COMPLETE boolean NOT NULL default true;
+"""
@@ -1,7 +1,8 @@
-
+# Range partitioning by TRADEDATE (yearly partitions: session_security_history_<year> + default).
+# Primary key (SECID, TRADEDATE, BOARDID) is the main filter "secid = $1 AND tradedate BETWEEN",
+# CLOSE/VALUE/VOLUME are included for index only scans of analytics. BRIN - for scans by date of all market.
 session_security_history = """
 CREATE TABLE IF NOT EXISTS session_security_history(
-    id bigserial,
     BOARDID varchar(12) NOT NULL,
     TRADEDATE date NOT NULL,
     SHORTNAME varchar(400) NULL,
@@ -23,10 +24,72 @@ CREATE TABLE IF NOT EXISTS session_security_history(
     ADMITTEDVALUE double precision NULL, 
     WAVAL double precision NULL, 
     TRADINGSESSION smallint NOT NULL,
-    PRIMARY KEY (id),
-    UNIQUE (BOARDID, TRADEDATE, SECID)
+    PRIMARY KEY (SECID, TRADEDATE, BOARDID) INCLUDE (CLOSE, VALUE, VOLUME)
+) PARTITION BY RANGE (TRADEDATE);
+CREATE TABLE IF NOT EXISTS session_security_history_default PARTITION OF session_security_history DEFAULT;
+CREATE INDEX IF NOT EXISTS session_security_history_tradedate_brin ON session_security_history
+    USING brin (TRADEDATE);
+"""
+
+# Run on every start (idempotent): yearly partitions up to next year (only for partitioned table)
+session_security_history_partitions = """
+DO $$
+DECLARE
+    year integer;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('session_security_history')) = 'p' THEN
+        FOR year IN 1997..extract(year FROM current_date)::integer + 1 LOOP
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    'session_security_history' || '_' || year,
+                    'session_security_history',
+                    make_date(year, 1, 1),
+                    make_date(year + 1, 1, 1)
+                );
+            EXCEPTION
+                WHEN check_violation THEN  -- ROWS OF THIS YEAR ARE IN DEFAULT PARTITION
+                    RAISE WARNING 'Partition of % for year % is not created', 'session_security_history', year;
+            END;
+        END LOOP;
+    END IF;
+END $$;
+"""
+
+# Run on every start: not migrated (heap) table has no index by SECID first (summary, requests by secid)
+session_security_history_secid_index = """
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('session_security_history')) = 'r' THEN
+        CREATE INDEX IF NOT EXISTS session_security_history_secid_tradedate
+            ON session_security_history (SECID, TRADEDATE);
+    END IF;
+END $$;
+"""
+
+# Known days of market: trading (is_trading) and non-trading. Days without row are unknown.
+trading_calendar = """
+CREATE TABLE IF NOT EXISTS trading_calendar(
+    engine varchar(45) NOT NULL,
+    market varchar(45) NOT NULL,
+    tradedate date NOT NULL,
+    is_trading boolean NOT NULL,
+    PRIMARY KEY (engine, market, tradedate)
 );
-CREATE INDEX IF NOT EXISTS session_security_history_idx ON session_security_history (
-    BOARDID, TRADEDATE, SECID
+"""
+
+# Latest quote and 52 weeks statistics by secid. Maintained in transactions that save history.
+security_summary = """
+CREATE TABLE IF NOT EXISTS security_summary(
+    secid varchar(150) NOT NULL,
+    last_date date NOT NULL,
+    last_boardid varchar(12) NOT NULL,
+    last_close double precision NULL,
+    high_52w double precision NULL,
+    low_52w double precision NULL,
+    avg_turnover_52w double precision NULL,
+    trading_days_52w integer NOT NULL,
+    update_date timestamp NOT NULL default current_timestamp,
+    PRIMARY KEY (secid)
 );
-"""
\ No newline at end of file
+"""
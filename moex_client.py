@@ -0,0 +1,154 @@
+import asyncio
+import random
+from typing import Any
+
+import aiohttp
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from loguru import logger
+from config import settings
+from utils import singleton
+from utils.http.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.http.fast_json import json_loads
+from utils.http.throttle import AdaptiveTokenBucket
+
+
+class MoexApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status: int, retry_after: str | None):
+        super().__init__(f"status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+@singleton
+class MoexClient:
+    """Application scoped http client for MOEX ISS (keep-alive pool, dns cache, per host limits).
+    All ISS calls go through 'get_json': shared adaptive throttle, retries with jitter and circuit breaker."""
+    _session: ClientSession = None
+
+    def __init__(self):
+        self.throttle = AdaptiveTokenBucket(
+            rate=settings.MOEX_RATE_LIMIT,
+            min_rate=settings.MOEX_RATE_MIN,
+            burst=settings.MOEX_RATE_BURST,
+            slow_response=settings.MOEX_SLOW_RESPONSE,
+        )
+        self.breaker = CircuitBreaker(
+            "moex_iss",
+            failure_threshold=settings.MOEX_BREAKER_FAILURES,
+            reset_timeout=settings.MOEX_BREAKER_RESET,
+        )
+
+    @staticmethod
+    def default_timeout() -> ClientTimeout:
+        return ClientTimeout(
+            total=settings.MOEX_TOTAL_TIMEOUT,
+            connect=settings.MOEX_CONNECT_TIMEOUT,
+            sock_read=settings.MOEX_READ_TIMEOUT,
+        )
+
+    @staticmethod
+    def default_connector() -> TCPConnector:
+        return TCPConnector(
+            limit=settings.MOEX_CONNECTION_LIMIT,
+            limit_per_host=settings.MOEX_CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.MOEX_DNS_CACHE_TTL,
+            keepalive_timeout=settings.MOEX_KEEPALIVE_TIMEOUT,
+        )
+
+    async def create_session(self, session: ClientSession | None = None):
+        """Create global session. Use 'session' for replace client (stub server in tests, for example)"""
+        if session is not None:
+            await self.close()
+            self._session = session
+        elif not self._session or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self.default_connector(),
+                timeout=self.default_timeout(),
+                raise_for_status=False,
+            )
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> ClientSession:
+        if not self._session or self._session.closed:
+            raise RuntimeError("MOEX client session is not created. Call 'create_session' on application startup")
+        return self._session
+
+    @staticmethod
+    def backoff(attempt: int, retry_after: str | None = None) -> float:
+        """Full jitter exponential backoff, 'Retry-After' (seconds) has priority"""
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, min(settings.MOEX_RETRY_MAX_DELAY, settings.MOEX_RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def get_json(self, url: str, params: dict | None = None) -> Any:
+        """GET json from ISS. Raise MoexApiError (status 503 - MOEX is unavailable or retry budget is over).
+        Breaker counts one failure by request (after retries) and only for transport errors, 429/5xx and timeouts"""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as error:
+            raise MoexApiError(503, str(error)) from error
+        try:
+            result = await self._get_with_retries(url, params)
+        except MoexApiError as error:
+            if error.status == 429 or error.status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # SERVICE IS ALIVE, REQUEST IS WRONG
+            raise
+        except BaseException:
+            self.breaker.release()  # CANCELLED (CLIENT IS GONE, SIBLING TASK FAILED) OR NOT ISS ERROR
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _get_with_retries(self, url: str, params: dict | None = None) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.MOEX_RETRY_BUDGET
+        attempt = 0
+        while True:
+            await self.throttle.acquire()
+            started = loop.time()
+            try:
+                async with self.session.get(url, params=params) as response:
+                    if response.status == 429 or response.status >= 500:
+                        raise _RetryableStatus(response.status, response.headers.get("Retry-After"))
+                    if response.status >= 400:
+                        raise MoexApiError(response.status, f"MOEX {url} return status - {response.status}")
+                    try:
+                        result = json_loads(await response.read())
+                    except ValueError:  # NOT JSON BODY WITH 200 (MAINTENANCE PAGE): BAD GATEWAY, RETRY
+                        raise _RetryableStatus(502, None)
+            except (_RetryableStatus, aiohttp.ClientError, asyncio.TimeoutError) as error:
+                self.throttle.on_throttle()
+                attempt += 1
+                status = error.status if isinstance(error, _RetryableStatus) else 503
+                delay = self.backoff(attempt, getattr(error, "retry_after", None))
+                if attempt >= settings.MOEX_RETRY_ATTEMPTS or loop.time() + delay > deadline:
+                    raise MoexApiError(status, f"MOEX {url} is unavailable after {attempt} attempts: {error!r}")
+                logger.warning("MOEX {} attempt {} error: {!r}. Retry in {:.2f}s", url, attempt, error, delay)
+                await asyncio.sleep(delay)
+                continue
+            self.throttle.on_success(loop.time() - started)
+            return result
+
+    def __del__(self):
+        try:
+            if self._session and not self._session.closed:
+                asyncio.get_running_loop().create_task(self._session.close())
+        except Exception:
+            pass
+
+
+MOEX_CLIENT = MoexClient()
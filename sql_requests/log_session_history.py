@@ -1,51 +1,152 @@
 
 
+# Gaps = requested range minus all logged periods (success and wait). Wait rows are returned for awaiting.
 raw_sql_get_requests_to_api_history = """
-    WITH TMP AS (SELECT id,
-                        row_number() over (order by start_date)        as position,
-                        start_date,
-                        end_date,
-                        lead(start_date) over (order by start_date)    as next_date,
-                        case when status = 'success' then 0 else 1 end as wait_status
-                 FROM logs_session_security_history
-                 WHERE secid = $1
-                   AND engine = $2
-                   AND market = $3
-                   AND session = $4
-                   AND (
-                         start_date between $5 AND $6
-                         OR end_date between $5 AND $6
-                         OR (start_date <= $5  AND end_date >= $6)
-                     ))
-    
+    WITH LOGS AS (SELECT id,
+                         status,
+                         period
+                  FROM logs_session_security_history
+                  WHERE secid = $1
+                    AND engine = $2
+                    AND market = $3
+                    AND session = $4
+                    AND period && daterange($5, $6, '[]'))
+
     SELECT id,
-           wait_status,
-           request_date
-    FROM (SELECT null                                           id,
-                 0                                              wait_status,
-                 ARRAY [$5, start_date - 1]                     request_date
-          FROM TMP
-          WHERE position = 1
-            and start_date > $5
-          UNION ALL
-          SELECT id,
-                 wait_status,
-                 CASE
-                     WHEN end_date < $6 THEN
-                         CASE
-                             WHEN next_date is NULL THEN ARRAY[end_date + 1, $6]
-                             ELSE CASE
-                                      WHEN next_date - end_date > 1 THEN ARRAY[end_date + 1, next_date - 1]
-                                 END
-                             END
-                     END as request_date
-          FROM TMP
-          UNION ALL
-          SELECT null          as id,
-                 0             as wait_status,
-                 ARRAY[$5, $6] as request_date
-          WHERE NOT exists(SELECT * FROM TMP)
-    ) as t1
-    WHERE request_date is not null
-       or wait_status = 1
-"""
\ No newline at end of file
+           1                  as wait_status,
+           null::date[]       as request_date
+    FROM LOGS
+    WHERE status != 'success'
+    UNION ALL
+    SELECT null::bigint                              as id,
+           0                                         as wait_status,
+           ARRAY [lower(gap), upper(gap) - 1]        as request_date
+    FROM unnest(
+        datemultirange(daterange($5, $6, '[]'))
+        - coalesce((SELECT range_agg(period) FROM LOGS), '{}'::datemultirange)
+    ) as gap
+"""
+
+
+raw_sql_get_requests_to_api_history_batch = """
+    WITH REQUESTS AS (SELECT DISTINCT secid, engine, market, session
+                      FROM unnest($1::varchar[], $2::varchar[], $3::varchar[], $4::smallint[])
+                          AS r(secid, engine, market, session)),
+         LOGS AS (SELECT l.id,
+                         l.secid,
+                         l.engine,
+                         l.market,
+                         l.session,
+                         l.status,
+                         l.period
+                  FROM logs_session_security_history l
+                  JOIN REQUESTS r
+                    ON r.secid = l.secid
+                   AND r.engine = l.engine
+                   AND r.market = l.market
+                   AND r.session = l.session
+                  WHERE l.period && daterange($5, $6, '[]'))
+
+    SELECT secid,
+           engine,
+           market,
+           session,
+           id,
+           1                  as wait_status,
+           null::date[]       as request_date
+    FROM LOGS
+    WHERE status != 'success'
+    UNION ALL
+    SELECT r.secid,
+           r.engine,
+           r.market,
+           r.session,
+           null::bigint                              as id,
+           0                                         as wait_status,
+           ARRAY [lower(gap), upper(gap) - 1]        as request_date
+    FROM REQUESTS r
+    LEFT JOIN LATERAL (SELECT range_agg(l.period) as covered
+                       FROM LOGS l
+                       WHERE l.secid = r.secid
+                         AND l.engine = r.engine
+                         AND l.market = r.market
+                         AND l.session = r.session) c ON true
+    CROSS JOIN LATERAL unnest(
+        datemultirange(daterange($5, $6, '[]')) - coalesce(c.covered, '{}'::datemultirange)
+    ) as gap
+"""
+
+# Merge overlapping and adjacent success intervals of one key (only if something can be merged).
+# Run in transaction after raw_sql_lock_history_key.
+raw_sql_lock_history_key = """
+    SELECT pg_advisory_xact_lock(hashtext(concat_ws('/', $1::varchar, $2::varchar, $3::varchar, $4::smallint)))
+"""
+
+raw_sql_merge_success_history = """
+    WITH CURRENT AS (SELECT id, period
+                     FROM logs_session_security_history
+                     WHERE secid = $1
+                       AND engine = $2
+                       AND market = $3
+                       AND session = $4
+                       AND status = 'success'),
+         MERGED AS (SELECT unnest(range_agg(period)) as period FROM CURRENT),
+         NEED AS (SELECT (SELECT count(*) FROM MERGED) < (SELECT count(*) FROM CURRENT) as value),
+         DELETED AS (DELETE FROM logs_session_security_history l
+                     USING CURRENT c, NEED n
+                     WHERE l.id = c.id
+                       AND n.value
+                     RETURNING l.id)
+    INSERT INTO logs_session_security_history (secid, engine, market, session, start_date, end_date, status)
+    SELECT $1::varchar, $2::varchar, $3::varchar, $4::smallint, lower(m.period), upper(m.period) - 1, 'success'
+    FROM MERGED m, NEED n
+    WHERE n.value
+      AND (SELECT count(*) FROM DELETED) > 0
+"""
+
+
+raw_sql_get_market_sync_date = """
+    SELECT last_date FROM sync_session_security_history WHERE engine = $1 AND market = $2 AND session = $3
+"""
+
+raw_sql_set_market_sync_date = """
+    INSERT INTO sync_session_security_history (engine, market, session, last_date)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (engine, market, session) DO UPDATE
+        SET last_date = EXCLUDED.last_date,
+            update_date = current_timestamp
+"""
+
+# Full market data for date: every success interval that ends on previous date is extended to this date
+raw_sql_extend_market_coverage = """
+    UPDATE logs_session_security_history l
+    SET end_date = $4
+    WHERE l.engine = $1
+      AND l.market = $2
+      AND l.session = $3
+      AND l.status = 'success'
+      AND l.end_date = $4::date - 1
+      AND NOT exists(SELECT 1
+                     FROM logs_session_security_history o
+                     WHERE o.engine = l.engine
+                       AND o.market = l.market
+                       AND o.session = l.session
+                       AND o.secid = l.secid
+                       AND o.start_date = l.start_date
+                       AND o.end_date = $4)
+"""
+
+raw_sql_insert_market_coverage = """
+    INSERT INTO logs_session_security_history (engine, market, session, secid, start_date, end_date, status)
+    SELECT $1::varchar, $2::varchar, $3::smallint, s.secid, $4::date, $4::date, 'success'
+    FROM (SELECT DISTINCT unnest($5::varchar[]) AS secid) s
+    WHERE NOT exists(SELECT 1
+                     FROM logs_session_security_history l
+                     WHERE l.engine = $1
+                       AND l.market = $2
+                       AND l.session = $3
+                       AND l.secid = s.secid
+                       AND l.status = 'success'
+                       AND $4 between l.start_date AND l.end_date)
+    ON CONFLICT DO NOTHING
+"""
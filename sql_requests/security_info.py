@@ -18,7 +18,7 @@ SELECT secid,
     groupname,
     emitter_id
 FROM security_description
-WHERE %s = $1
+WHERE %s = $1 AND complete
 """
 
 INSERT_INTO_SECURITY = """
@@ -42,7 +42,25 @@ INSERT INTO security_description(
     emitter_id
 )
 VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
-ON CONFLICT DO NOTHING
+ON CONFLICT (secid) DO UPDATE SET
+    "NAME" = EXCLUDED."NAME",
+    shortname = EXCLUDED.shortname,
+    isin = EXCLUDED.isin,
+    regnumber = EXCLUDED.regnumber,
+    issuesize = EXCLUDED.issuesize,
+    facevalue = EXCLUDED.facevalue,
+    faceunit = EXCLUDED.faceunit,
+    issuedate = EXCLUDED.issuedate,
+    latname = EXCLUDED.latname,
+    listlevel = EXCLUDED.listlevel,
+    isqualifiedinvestors = EXCLUDED.isqualifiedinvestors,
+    typename = EXCLUDED.typename,
+    "GROUP" = EXCLUDED."GROUP",
+    "TYPE" = EXCLUDED."TYPE",
+    groupname = EXCLUDED.groupname,
+    emitter_id = EXCLUDED.emitter_id,
+    complete = true
+WHERE NOT security_description.complete  -- ONLY PARTIAL ROW (LISTING PRELOAD) IS COMPLETED
 """
 
 SECURITY_COLUMNS = [
@@ -64,3 +82,13 @@ SECURITY_COLUMNS = [
     "GROUPNAME",
     "EMITTER_ID",
 ]
+
+GET_SECIDS_INFO = (GET_SECID_INFO % "secid").replace("= $1", "= any($1::varchar[])")
+
+# Preload of ISS securities listing: only new securities, rows are partial (completed from ISS on request)
+INSERT_SECURITIES_LIST = """
+INSERT INTO security_description(secid, "NAME", shortname, isin, regnumber, "TYPE", "GROUP", emitter_id, complete)
+SELECT *, false FROM unnest($1::varchar[], $2::varchar[], $3::varchar[], $4::varchar[], $5::varchar[],
+                            $6::varchar[], $7::varchar[], $8::varchar[])
+ON CONFLICT DO NOTHING
+"""
@@ -0,0 +1,32 @@
+# Trigram search ($1 - query, threshold is set by set_config in transaction) + prefix of secid ($2 - upper query,
+# $3 - escaped LIKE pattern). Keyset pagination by (rank DESC, secid): $4, $5 - last row of previous page.
+raw_sql_search_securities = """
+    WITH found AS (
+        SELECT secid,
+               shortname,
+               "NAME" AS name,
+               isin,
+               round(greatest(
+                   CASE WHEN secid = $2 THEN 1 WHEN secid LIKE $3 THEN 0.9 ELSE 0 END,
+                   similarity("NAME", $1),
+                   similarity(shortname, $1),
+                   similarity(isin, $1)
+               )::numeric, 4)::float8 AS rank
+        FROM security_description
+        WHERE "NAME" % $1
+           OR shortname % $1
+           OR isin % $1
+           OR secid LIKE $3
+    )
+    SELECT secid, shortname, name, isin, rank
+    FROM found
+    WHERE $4::float8 IS NULL
+       OR rank < $4
+       OR (rank = $4 AND secid > $5::varchar)
+    ORDER BY rank DESC, secid
+    LIMIT $6
+"""
+
+raw_sql_search_prefix_index = """
+    SELECT secid, shortname, "NAME", isin FROM security_description
+"""
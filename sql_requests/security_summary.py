@@ -0,0 +1,68 @@
+# Serialize refresh of same secids ($1) between concurrent transactions (parallel sub-ranges of one secid,
+# market sync): lock is waited before refresh, so refresh sees rows committed by other transaction.
+# Locks are taken in one order (by key) - no deadlocks between transactions with many secids.
+raw_sql_lock_security_summary = """
+    SELECT pg_advisory_xact_lock(key)
+    FROM (SELECT DISTINCT hashtext(secid) AS key FROM unnest($1::varchar[]) AS s(secid) ORDER BY key) keys
+"""
+
+# Summary of secids ($1) from history: last close (board with max turnover) and 52 weeks window
+# before last date. Every secid is read by primary key (secid, tradedate) of partitioned session_security_history
+# (index session_security_history_secid_tradedate for not migrated table).
+_summary_from_history = """
+    WITH last AS (
+        SELECT s.secid, l.tradedate, l.boardid, l.close
+        FROM unnest($1::varchar[]) AS s(secid)
+        CROSS JOIN LATERAL (
+            SELECT tradedate, boardid, close
+            FROM session_security_history
+            WHERE secid = s.secid
+              AND close IS NOT NULL
+            ORDER BY tradedate DESC, value DESC NULLS LAST
+            LIMIT 1
+        ) l
+    ),
+    year AS (
+        SELECT h.secid,
+               max(h.high)                                  AS high_52w,
+               min(h.low)                                   AS low_52w,
+               sum(h.value) / count(DISTINCT h.tradedate)   AS avg_turnover_52w,
+               count(DISTINCT h.tradedate)                  AS trading_days_52w
+        FROM last
+        JOIN session_security_history h ON h.secid = last.secid
+            AND h.tradedate > last.tradedate - 365
+            AND h.tradedate <= last.tradedate
+        GROUP BY h.secid
+    )
+"""
+_summary_select = """
+    SELECT last.secid, last.tradedate AS last_date, last.boardid AS last_boardid, last.close AS last_close,
+           year.high_52w, year.low_52w, year.avg_turnover_52w, year.trading_days_52w
+    FROM last
+    JOIN year USING (secid)
+"""
+
+raw_sql_refresh_security_summary = _summary_from_history + """
+    INSERT INTO security_summary (
+        secid, last_date, last_boardid, last_close, high_52w, low_52w, avg_turnover_52w, trading_days_52w
+    )
+""" + _summary_select + """
+    ON CONFLICT (secid) DO UPDATE SET
+        last_date = EXCLUDED.last_date,
+        last_boardid = EXCLUDED.last_boardid,
+        last_close = EXCLUDED.last_close,
+        high_52w = EXCLUDED.high_52w,
+        low_52w = EXCLUDED.low_52w,
+        avg_turnover_52w = EXCLUDED.avg_turnover_52w,
+        trading_days_52w = EXCLUDED.trading_days_52w,
+        update_date = current_timestamp
+"""
+
+# Read without summary row (summary is not filled yet): calculated from history, not saved
+raw_sql_calc_security_summary = _summary_from_history + _summary_select
+
+raw_sql_get_security_summary = """
+    SELECT secid, last_date, last_boardid, last_close, high_52w, low_52w, avg_turnover_52w, trading_days_52w
+    FROM security_summary
+    WHERE secid = any($1::varchar[])
+"""
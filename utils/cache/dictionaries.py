@@ -0,0 +1,66 @@
+"""
+IN-MEMORY CACHE OF DICTIONARIES (engines, markets, boards, etc.).
+Dictionaries change only on refresh from MOEX, so validation can check sets without DB round-trip.
+"""
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from loguru import logger
+
+from db import MOEX_DB
+from utils import singleton
+
+SQL_DICTIONARY_VALUES = "SELECT DISTINCT %s FROM %s"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@singleton
+class DictionaryCache:
+    def __init__(self):
+        self._registered: set[tuple[str, str]] = set()
+        self._values: dict[tuple[str, str], frozenset] = {}
+        self.stats = CacheStats()
+
+    def register(self, dictionaries: Iterable[tuple[str, str]]):
+        """dictionaries - pairs (table, attribute)"""
+        self._registered.update((table, attribute) for table, attribute in dictionaries)
+
+    def invalidate(self):
+        self._values = {}
+        self.stats.invalidations += 1
+
+    async def reload(self):
+        """Invalidate and load all registered dictionaries. Call after every refresh of dictionaries"""
+        self.invalidate()
+        values = {}
+        async with MOEX_DB.pool.acquire() as connection:
+            for table, attribute in self._registered:
+                rows = await connection.fetch(SQL_DICTIONARY_VALUES % (attribute, table))
+                values[(table, attribute)] = frozenset(row[0] for row in rows)
+        self._values = values
+        self.stats.loads += 1
+        logger.info("Dictionary cache loaded: {}", {f"{table}.{attr}": len(v) for (table, attr), v in values.items()})
+
+    def check(self, table: str, attribute: str, value: Any) -> bool | None:
+        """True/False - value exists in loaded dictionary. None - dictionary is not loaded (check in DB)"""
+        values = self._values.get((table, attribute))
+        if values is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return value in values
+
+
+DICTIONARY_CACHE = DictionaryCache()
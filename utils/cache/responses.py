@@ -0,0 +1,196 @@
+"""
+READ-THROUGH CACHE FOR API RESPONSES.
+Backends: Redis (if 'redis' package installed and REDIS_DSN set) or in-memory (TTL + LRU).
+Supports negative caching ('not found' answers) and single-flight of concurrent misses by key.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Protocol
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from config import settings
+from utils import singleton
+
+try:
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # OPTIONAL DEPENDENCY
+    aioredis = None
+    RedisError = Exception
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> str | None:
+        ...
+
+    async def set(self, key: str, value: str, ttl: int):
+        ...
+
+    async def delete(self, key: str):
+        ...
+
+    async def close(self):
+        ...
+
+
+class MemoryCacheBackend:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        if (item := self._data.get(key)) is None:
+            return None
+        expire_at, value = item
+        if expire_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: int):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def close(self):
+        self._data.clear()
+
+
+class RedisCacheBackend:
+    """Errors of redis are logged and handled as cache miss"""
+
+    def __init__(self, dsn: str):
+        self._client = aioredis.from_url(dsn, decode_responses=True)
+
+    async def get(self, key: str) -> str | None:
+        try:
+            return await self._client.get(key)
+        except RedisError as error:
+            logger.error("Redis cache get '{}' error: {}", key, error)
+
+    async def set(self, key: str, value: str, ttl: int):
+        try:
+            await self._client.set(key, value, ex=ttl)
+        except RedisError as error:
+            logger.error("Redis cache set '{}' error: {}", key, error)
+
+    async def delete(self, key: str):
+        try:
+            await self._client.delete(key)
+        except RedisError as error:
+            logger.error("Redis cache delete '{}' error: {}", key, error)
+
+    async def close(self):
+        await self._client.close()
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.negative_hits + self.misses + self.coalesced
+        return (self.hits + self.negative_hits) / total if total else 0.0
+
+
+@singleton
+class ResponseCache:
+    KEY_PREFIX = "moex_fast_utils:"
+
+    def __init__(self):
+        self.backend: CacheBackend = MemoryCacheBackend(settings.CACHE_MEMORY_MAX_SIZE)
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.stats = ResponseCacheStats()
+
+    async def connect(self, backend: CacheBackend | None = None):
+        """Select backend by settings. 'backend' - explicit backend (for tests, for example)"""
+        if backend is not None:
+            self.backend = backend
+        elif settings.CACHE_BACKEND == "redis":
+            if aioredis is None or not settings.REDIS_DSN:
+                logger.warning("Redis cache is not available ('redis' package or REDIS_DSN). Use memory cache")
+            else:
+                self.backend = RedisCacheBackend(settings.REDIS_DSN)
+
+    async def close(self):
+        await self.backend.close()
+
+    async def invalidate(self, key: str):
+        await self.backend.delete(self.KEY_PREFIX + key)
+
+    @staticmethod
+    def _unpack(entry: dict) -> Any:
+        if entry.get("negative"):
+            if entry.get("status_code"):
+                raise HTTPException(status_code=entry["status_code"], detail=entry.get("detail"))
+            return None
+        return entry["value"]
+
+    async def _load(self, loader: Callable[[], Awaitable[Any]]) -> tuple[dict, int]:
+        try:
+            value = await loader()
+        except HTTPException as error:
+            if error.status_code != 404:
+                raise
+            return {"negative": True, "status_code": error.status_code, "detail": error.detail}, \
+                settings.CACHE_NEGATIVE_TTL
+        if value is None:
+            return {"negative": True}, settings.CACHE_NEGATIVE_TTL
+        return {"value": jsonable_encoder(value)}, settings.CACHE_TTL
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Read-through: value from cache or from loader (only one loader by key at same time)"""
+        full_key = self.KEY_PREFIX + key
+        if (cached := await self.backend.get(full_key)) is not None:
+            entry = json.loads(cached)
+            if entry.get("negative"):
+                self.stats.negative_hits += 1
+            else:
+                self.stats.hits += 1
+            return self._unpack(entry)
+
+        while (in_flight := self._in_flight.get(full_key)) is not None:
+            try:
+                entry = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                continue  # LOADER WAS CANCELLED: WAIT NEXT LOADER OR LOAD BY ITSELF
+            self.stats.coalesced += 1
+            return self._unpack(entry)
+
+        self.stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[full_key] = future
+        try:
+            entry, ttl = await self._load(loader)
+            await self.backend.set(full_key, json.dumps(entry), ttl)
+            future.set_result(entry)
+            return self._unpack(entry)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            future.exception()  # MARK AS RETRIEVED IF NOBODY WAITS
+            raise
+        finally:
+            self._in_flight.pop(full_key, None)
+
+
+RESPONSE_CACHE = ResponseCache()
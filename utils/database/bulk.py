@@ -0,0 +1,75 @@
+"""
+BULK INGESTION: COPY into temporary staging table + one INSERT ... SELECT ... ON CONFLICT merge.
+Must be called in transaction (staging table is dropped on commit).
+Column names are lowercased (MOEX returns upper case names for unquoted Postgres columns).
+"""
+from typing import Iterable, Sequence
+
+from asyncpg import Connection
+
+from config import settings
+from utils.metrics import INGEST_SECONDS, ROWS_INGESTED
+
+SQL_CREATE_STAGING = "CREATE TEMP TABLE %s ON COMMIT DROP AS SELECT %s FROM %s WITH NO DATA"
+SQL_MERGE_STAGING = "INSERT INTO %s (%s) SELECT %s FROM %s ON CONFLICT %s"
+
+
+def staging_table_name(table: str) -> str:
+    return f"staging_{table}"
+
+
+def insert_template(table: str, columns: Sequence[str], on_conflict: str = "DO NOTHING") -> str:
+    return "INSERT INTO %s (%s) VALUES (%s) ON CONFLICT %s" % (
+        table,
+        ", ".join(f'"{column.lower()}"' for column in columns),
+        ", ".join(f"${idx}" for idx in range(1, len(columns) + 1)),
+        on_conflict,
+    )
+
+
+async def copy_upsert(
+        connection: Connection,
+        table: str,
+        columns: Sequence[str],
+        records: Iterable[Sequence],
+        on_conflict: str = "DO NOTHING",
+) -> str:
+    """Load records by COPY into staging table and merge into 'table'. Return status of merge"""
+    staging = staging_table_name(table)
+    columns = [column.lower() for column in columns]
+    quoted_columns = ", ".join(f'"{column}"' for column in columns)
+    await connection.execute(SQL_CREATE_STAGING % (staging, quoted_columns, table))
+    await connection.copy_records_to_table(staging, records=records, columns=columns)
+    return await connection.execute(
+        SQL_MERGE_STAGING % (table, quoted_columns, quoted_columns, staging, on_conflict)
+    )
+
+
+async def bulk_upsert(
+        connection: Connection,
+        table: str,
+        columns: Sequence[str],
+        records: Sequence[Sequence],
+        on_conflict: str = "DO NOTHING",
+):
+    """Choose ingestion path by settings: COPY for big batches, executemany for small or 'insert' mode"""
+    with INGEST_SECONDS.time(table=table):
+        await _bulk_upsert(connection, table, columns, records, on_conflict)
+    ROWS_INGESTED.inc(len(records), table=table)
+
+
+async def _bulk_upsert(
+        connection: Connection,
+        table: str,
+        columns: Sequence[str],
+        records: Sequence[Sequence],
+        on_conflict: str = "DO NOTHING",
+):
+    if settings.INGESTION_MODE == "copy" and len(records) >= settings.INGESTION_COPY_MIN_ROWS:
+        if connection.is_in_transaction():
+            await copy_upsert(connection, table, columns, records, on_conflict)
+        else:
+            async with connection.transaction():
+                await copy_upsert(connection, table, columns, records, on_conflict)
+    else:
+        await connection.executemany(insert_template(table, columns, on_conflict), records)
@@ -0,0 +1,120 @@
+"""
+INCREMENTAL REFRESH OF MOEX DICTIONARIES (handbook, engines, markets, boards, etc.).
+Refresh is skipped if last one was less than DICTIONARY_REFRESH_INTERVAL ago.
+Dictionary with same content hash is not touched, otherwise only changed rows are upserted and removed rows deleted.
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from asyncpg import Connection
+from loguru import logger
+
+from config import settings
+from db import MOEX_DB
+from migrations import market_types
+from moex_client import MOEX_CLIENT
+from utils.cache.dictionaries import DICTIONARY_CACHE
+from utils.database.bulk import bulk_upsert
+
+SQL_REFRESH_STATE = "SELECT name, content_hash, refresh_date FROM dictionary_refresh"
+SQL_SAVE_REFRESH_STATE = """
+    INSERT INTO dictionary_refresh (name, content_hash, refresh_date)
+    VALUES ($1, $2, current_timestamp)
+    ON CONFLICT (name) DO UPDATE SET content_hash = EXCLUDED.content_hash, refresh_date = EXCLUDED.refresh_date
+"""
+SQL_DICTIONARY_ROWS = "SELECT %s FROM %s"
+SQL_DELETE_ROWS = 'DELETE FROM %s WHERE "%s" = any($1)'
+
+
+def quoted(columns: list[str]) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def content_hash(data: dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+async def refresh_state() -> dict[str, tuple[str, datetime]]:
+    async with MOEX_DB.pool.acquire() as connection:
+        return {row["name"]: (row["content_hash"], row["refresh_date"]) for row in await connection.fetch(SQL_REFRESH_STATE)}
+
+
+def need_refresh(state: dict[str, tuple[str, datetime]]) -> bool:
+    if any(table not in state for table in market_types.create_table_order):
+        return True
+    oldest = min(refresh_date for _, refresh_date in state.values())
+    return datetime.now() - oldest >= timedelta(seconds=settings.DICTIONARY_REFRESH_INTERVAL)
+
+
+async def diff_dictionary(connection: Connection, table: str, data: dict) -> tuple[list[list], list]:
+    """Return rows for upsert (new and changed) and primary keys for delete"""
+    columns = [column.lower() for column in data["columns"]]
+    key_position = columns.index(market_types.primary_keys[table])
+    current = {
+        row[key_position]: tuple(row)
+        for row in await connection.fetch(SQL_DICTIONARY_ROWS % (quoted(columns), table))
+    }
+    upsert = [row for row in data["data"] if current.get(row[key_position]) != tuple(row)]
+    new_keys = {row[key_position] for row in data["data"]}
+    return upsert, [key for key in current if key not in new_keys]
+
+
+async def apply_changes(changes: dict[str, tuple[dict, list[list], list]]):
+    """Parents are upserted first, deletes are in reverse order (children first)"""
+    order = market_types.create_table_order
+    async with MOEX_DB.pool.acquire() as connection:
+        async with connection.transaction():
+            for table in order:
+                if table in changes and changes[table][1]:
+                    data, upsert, _ = changes[table]
+                    key = market_types.primary_keys[table]
+                    update = ", ".join(
+                        f'"{column}" = EXCLUDED."{column}"' for column in map(str.lower, data["columns"]) if column != key
+                    )
+                    await bulk_upsert(connection, table, data["columns"], upsert, f'("{key}") DO UPDATE SET {update}')
+            for table in reversed(order):
+                if table in changes and changes[table][2]:
+                    await connection.execute(
+                        SQL_DELETE_ROWS % (table, market_types.primary_keys[table]), changes[table][2]
+                    )
+            for table, (data, _, _) in changes.items():
+                await connection.execute(SQL_SAVE_REFRESH_STATE, table, content_hash(data))
+
+
+async def refresh_dictionaries(force: bool = False) -> bool:
+    """Return True if dictionaries are changed"""
+    state = await refresh_state()
+    if not force and not need_refresh(state):
+        logger.info("Dictionaries are fresh, refresh is skipped")
+        return False
+
+    handbook, index_data = await asyncio.gather(
+        MOEX_CLIENT.get_json(settings.POINT_HANDBOOK),
+        MOEX_CLIENT.get_json(settings.POINT_MARKET_DICTIONARY),
+    )
+    dictionaries = {"handbook": handbook["handbooks_handbook"]}
+    dictionaries.update({table: index_data[table] for table in market_types.create_table_order[1:]})
+
+    changes = {}
+    async with MOEX_DB.pool.acquire() as connection:
+        for table, data in dictionaries.items():
+            if state.get(table, (None,))[0] == content_hash(data):
+                changes[table] = (data, [], [])  # ONLY REFRESH DATE
+                continue
+            upsert, delete = await diff_dictionary(connection, table, data)
+            changes[table] = (data, upsert, delete)
+
+    await apply_changes(changes)
+    changed = {table: (len(upsert), len(delete)) for table, (_, upsert, delete) in changes.items() if upsert or delete}
+    logger.info("Dictionaries refresh (upsert, delete): {}", changed or "without changes")
+    return bool(changed)
+
+
+async def refresh_dictionaries_in_background():
+    try:
+        if await refresh_dictionaries():
+            await DICTIONARY_CACHE.reload()
+    except Exception as error:
+        logger.error("Background refresh of dictionaries error: {}", error)
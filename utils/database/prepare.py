@@ -1,12 +1,13 @@
-import aiohttp
 import asyncio
 import sys
 from loguru import logger
 
 from db import MOEX_DB
 from migrations import market_types, securities_info, security_history, logs
-from config import settings
+from utils.cache.dictionaries import DICTIONARY_CACHE
+from utils.database.dictionary_refresh import refresh_dictionaries, refresh_dictionaries_in_background, refresh_state
 from utils.database.instruments import async_executor
+from utils.database.write_behind import WRITE_BEHIND
 
 
 def exit_if_error(_):
@@ -28,8 +29,8 @@ async def prepare_database():
     other_task = []
     for modul, model_tables in [
         [securities_info, ("security_description", "security_boards")],
-        [security_history, ("session_security_history",)],
-        [logs, ("logs_session_security_history",)],
+        [security_history, ("session_security_history", "trading_calendar", "security_summary")],
+        [logs, ("logs_session_security_history", "sync_session_security_history", "dictionary_refresh")],
     ]:
         for model_table in model_tables:
             if model_table not in tables:
@@ -37,32 +38,24 @@ async def prepare_database():
 
     await asyncio.gather(*other_task)
 
-
-async def save_dictionaries_in_db(table_name: str, data: dict) -> None:
-    sql_template = f"""
-        INSERT INTO {table_name}({', '.join(data['columns'])}) 
-        VALUES({', '.join(['$' + str(number) for number in range(1, len(data['columns']) + 1)])}) 
-        ON CONFLICT DO NOTHING;
-    """
-    async with MOEX_DB.pool.acquire() as connection:
-        await connection.executemany(sql_template, data["data"])
+    for modul, upgrade in [
+        [logs, "logs_session_security_history_coverage"],
+        [security_history, "session_security_history_partitions"],
+        [security_history, "session_security_history_secid_index"],
+        [securities_info, "security_description_search"],
+        [securities_info, "security_description_complete"],
+    ]:
+        await async_executor(getattr(modul, upgrade))
 
 
 @logger.catch(onerror=exit_if_error)
 async def get_dictionaries_from_moex():
-    # FIXME: ADD CHECK (RUN ONLY ONCE A WEEK)
-    async with aiohttp.ClientSession() as client:
-        handbook_dict, index_dict = await asyncio.gather(
-            client.get(settings.POINT_HANDBOOK),
-            client.get(settings.POINT_MARKET_DICTIONARY),
-        )
-        handbook, index_data = await asyncio.gather(handbook_dict.json(), index_dict.json())
-        handbook_data = handbook["handbooks_handbook"]
-        await save_dictionaries_in_db("handbook", handbook_data)
-
-        for table_ord_inx in range(1, len(market_types.create_table_order)):
-            table = market_types.create_table_order[table_ord_inx]
-            await save_dictionaries_in_db(table, index_data[table])
+    """First start - wait dictionaries from MOEX. Later - refresh them in background (startup doesn't wait)"""
+    if not await refresh_state():
+        await refresh_dictionaries(force=True)
+    else:
+        WRITE_BEHIND.spawn(refresh_dictionaries_in_background())
+    await DICTIONARY_CACHE.reload()
 
 
 async def del_await_history_from_api():
@@ -0,0 +1,142 @@
+"""
+WRITE-BEHIND OF NOT CRITICAL SAVES (security descriptions, boards) through QUEUE_THREAD.
+Request only puts rows in queue, one writer task coalesces rows into batches by table (key) and flushes them
+when batch has WRITE_BEHIND_BATCH_SIZE rows or after WRITE_BEHIND_FLUSH_INTERVAL seconds.
+Writer and background tasks are kept by strong references, on shutdown queue is drained.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Coroutine, Sequence
+
+from asyncpg import Connection
+from loguru import logger
+
+from config import settings, QUEUE_THREAD
+from db import MOEX_DB
+from utils import singleton
+from utils.database.bulk import bulk_upsert
+from utils.metrics import METRICS
+
+WRITE_BEHIND_ROWS = METRICS.counter("moex_write_behind_rows_total", "Rows written by write-behind", ("table",))
+WRITE_BEHIND_FAILED = METRICS.counter("moex_write_behind_failed_rows_total", "Dropped rows of write-behind", ("table",))
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class WriteKey:
+    """Rows with same key are written by one batch. 'sql' - own INSERT (executemany) instead of bulk_upsert"""
+    table: str
+    columns: tuple[str, ...] = ()
+    on_conflict: str = "DO NOTHING"
+    sql: str | None = None
+
+    async def write(self, connection: Connection, rows: list[Sequence]):
+        if self.sql:
+            await connection.executemany(self.sql, rows)
+        else:
+            await bulk_upsert(connection, self.table, self.columns, rows, self.on_conflict)
+
+
+@singleton
+class WriteBehind:
+    def __init__(self):
+        self._writer: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._stopping = False
+        self.pending_rows = 0  # ROWS IN CURRENT (NOT FLUSHED) BATCHES
+
+    @property
+    def depth(self) -> int:
+        return QUEUE_THREAD.qsize()
+
+    def start(self):
+        if self._writer is None or self._writer.done():
+            self._stopping = False
+            self._writer = asyncio.create_task(self._run())
+            self._writer.add_done_callback(self._writer_done)
+
+    def _writer_done(self, task: asyncio.Task):
+        """Writer must not die silently: full queue blocks all producers. Restart it (except stop)"""
+        if self._stopping or task.cancelled():
+            return
+        logger.error("Write-behind writer is stopped: {!r}. Restart", task.exception())
+        self._writer = None
+        self.pending_rows = 0
+        self.start()
+
+    async def stop(self):
+        """Wait background tasks, drain queue and flush all batches"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._stopping = True
+        if self._writer is not None and not self._writer.done():
+            await QUEUE_THREAD.put(_STOP)
+            await self._writer
+        self._writer = None
+
+    def spawn(self, coroutine: Coroutine) -> asyncio.Task:
+        """Background task with strong reference (is not collected by GC, is awaited on shutdown)"""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def submit(self, key: WriteKey, rows: Sequence[Sequence]):
+        """Put rows in queue (waits only if queue is full - backpressure)"""
+        if rows:
+            await QUEUE_THREAD.put((key, list(rows)))
+
+    async def _flush(self, batches: dict[WriteKey, list]):
+        for key, rows in batches.items():
+            for attempt in range(1, settings.WRITE_BEHIND_RETRIES + 1):
+                try:
+                    async with MOEX_DB.pool.acquire() as connection:
+                        async with connection.transaction():
+                            await key.write(connection, rows)
+                    WRITE_BEHIND_ROWS.inc(len(rows), table=key.table)
+                    break
+                except Exception as error:  # ANY ERROR: BATCH IS DROPPED, WRITER KEEPS WORKING
+                    logger.error("Write-behind {} ({} rows) attempt {} error: {!r}", key.table, len(rows), attempt, error)
+                    if attempt == settings.WRITE_BEHIND_RETRIES:
+                        WRITE_BEHIND_FAILED.inc(len(rows), table=key.table)
+                        logger.error("Write-behind {}: {} rows are dropped", key.table, len(rows))
+                    else:
+                        await asyncio.sleep(attempt)
+        batches.clear()
+        self.pending_rows = 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batches: dict[WriteKey, list] = {}
+        deadline = None
+        getter = None  # PENDING GET IS KEPT BETWEEN TIMEOUTS (ITEM IS NOT LOST)
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(QUEUE_THREAD.get())
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            if not done:
+                await self._flush(batches)
+                deadline = None
+                continue
+            item, getter = getter.result(), None
+            QUEUE_THREAD.task_done()
+            if item is _STOP:
+                while not QUEUE_THREAD.empty():
+                    item = QUEUE_THREAD.get_nowait()
+                    QUEUE_THREAD.task_done()
+                    if item is not _STOP:
+                        batches.setdefault(item[0], []).extend(item[1])
+                await self._flush(batches)
+                return
+            key, rows = item
+            batches.setdefault(key, []).extend(rows)
+            self.pending_rows += len(rows)
+            deadline = deadline or loop.time() + settings.WRITE_BEHIND_FLUSH_INTERVAL
+            if self.pending_rows >= settings.WRITE_BEHIND_BATCH_SIZE:
+                await self._flush(batches)
+                deadline = None
+
+
+WRITE_BEHIND = WriteBehind()
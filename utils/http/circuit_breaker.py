@@ -0,0 +1,56 @@
+"""
+CIRCUIT BREAKER: after N failures in a row calls fail fast for 'reset_timeout' seconds,
+then one trial call (half-open) decides: close circuit or open it again.
+"""
+import time
+from enum import Enum
+
+
+class CircuitState(str, Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.closed
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe = False
+
+    def before_call(self):
+        """Raise CircuitOpenError if call is not allowed"""
+        if self.state == CircuitState.closed:
+            return
+        if self.state == CircuitState.open:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit '{self.name}' is open")
+            self.state = CircuitState.half_open
+            self._probe = False
+        if self._probe:
+            raise CircuitOpenError(f"Circuit '{self.name}' is half-open, trial call is running")
+        self._probe = True
+
+    def record_success(self):
+        self.state = CircuitState.closed
+        self.failures = 0
+        self._probe = False
+
+    def release(self):
+        """Call is finished without result for breaker (cancelled): only free trial call of half-open state"""
+        self._probe = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe = False
+        if self.state == CircuitState.half_open or self.failures >= self.failure_threshold:
+            self.state = CircuitState.open
+            self.opened_at = time.monotonic()
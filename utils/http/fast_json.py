@@ -0,0 +1,31 @@
+"""
+FAST JSON for ISS payloads and API responses (orjson).
+ISO dates are parsed by date.fromisoformat with memoization (history repeats same dates for every board/secid).
+"""
+from datetime import date
+from functools import lru_cache
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+DATE_CACHE_SIZE = 65_536  # ~ 250 YEARS OF DAYS
+
+
+def json_loads(data: str | bytes) -> Any:
+    return orjson.loads(data)
+
+
+def json_dumps(value: Any) -> bytes:
+    """Dates are in ISO format, unknown types (Decimal, etc.) - str"""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value: str) -> date:
+    """'YYYY-MM-DD' -> date"""
+    return date.fromisoformat(value)
+
+
+# RESPONSE CLASS WITHOUT jsonable_encoder WHEN RETURNED DIRECTLY
+FastJSONResponse = ORJSONResponse
@@ -0,0 +1,47 @@
+"""
+ADAPTIVE TOKEN BUCKET (AIMD): rate grows slowly while responses are fast,
+falls by half on 429/5xx/network errors and by 20% on slow responses.
+"""
+import asyncio
+import time
+
+
+class AdaptiveTokenBucket:
+    INCREASE_PART = 0.05
+    SLOW_FACTOR = 0.8
+    THROTTLE_FACTOR = 0.5
+
+    def __init__(self, rate: float, min_rate: float, burst: int, slow_response: float):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.capacity = burst
+        self.slow_response = slow_response
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:  # FIFO FOR WAITERS
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def _decrease(self, factor: float):
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def on_success(self, latency: float):
+        if latency > self.slow_response:
+            self._decrease(self.SLOW_FACTOR)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.INCREASE_PART)
+
+    def on_throttle(self):
+        self._decrease(self.THROTTLE_FACTOR)
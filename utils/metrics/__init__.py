@@ -0,0 +1,23 @@
+from utils.metrics.registry import (
+    CODE_SECONDS,
+    DB_ACQUIRE_SECONDS,
+    DB_QUERY_SECONDS,
+    INGEST_SECONDS,
+    ISS_REQUEST_SECONDS,
+    METRICS,
+    ROWS_INGESTED,
+    WAIT_LOG_POLLS,
+    timed,
+)
+
+__all__ = [
+    "CODE_SECONDS",
+    "DB_ACQUIRE_SECONDS",
+    "DB_QUERY_SECONDS",
+    "INGEST_SECONDS",
+    "ISS_REQUEST_SECONDS",
+    "METRICS",
+    "ROWS_INGESTED",
+    "WAIT_LOG_POLLS",
+    "timed",
+]
@@ -0,0 +1,219 @@
+"""
+IN-PROCESS METRICS (counters, gauges, histograms) with Prometheus text exposition.
+Works without external collector: values are kept in memory and rendered on request (/metrics).
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Iterable
+
+from utils import singleton
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = tuple[str, ...]
+
+
+def format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+
+    def key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        """(suffix, labels, value)"""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {value}" for suffix, labels, value in self.samples())
+        return lines
+
+    def snapshot(self) -> dict:
+        return {f"{suffix}{labels}" or "value": value for suffix, labels, value in self.samples()}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self.key(labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield "", format_labels(self.label_names, key), value
+
+
+class Gauge(Metric):
+    """Gauge with set value or with callback (calculated on render: queue size, hit ratio, etc.)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+        self._callbacks: dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self.key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        self._callbacks[self.key(labels)] = function
+
+    def samples(self):
+        values = dict(self._values)
+        values.update((key, function()) for key, function in self._callbacks.items())
+        for key, value in values.items():
+            yield "", format_labels(self.label_names, key), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+            self, name: str, description: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[LabelValues, list[int]] = {}  # NOT CUMULATIVE, LAST - +Inf
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        if (counts := self._counts.get(key)) is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def time(self, **labels) -> "Timer":
+        return Timer(self, **labels)
+
+    def samples(self):
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield "_bucket", format_labels(self.label_names, key, le), cumulative
+            yield "_sum", format_labels(self.label_names, key), self._sums[key]
+            yield "_count", format_labels(self.label_names, key), cumulative
+
+
+class Timer:
+    """Observe duration in histogram. Context manager (sync and async) or decorator (sync and async functions)"""
+
+    def __init__(self, histogram: Histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self._starts: list[float] = []
+
+    def __enter__(self):
+        self._starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(time.perf_counter() - self._starts.pop(), **self.labels)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+    def __call__(self, function: Callable) -> Callable:
+        histogram, labels = self.histogram, self.labels
+
+        if asyncio.iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, **labels)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+
+
+@singleton
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def _get_or_create(self, cls: type, name: str, *args, **kwargs):
+        if (metric := self._metrics.get(name)) is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.kind}")
+        return metric
+
+    def counter(self, name: str, description: str, labels: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, description, labels)
+
+    def histogram(
+            self, name: str, description: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labels, buckets)
+
+    def render(self) -> str:
+        """Prometheus text format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict[str, dict]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+METRICS = MetricsRegistry()
+
+# COMMON METRICS OF HOT PATHS
+ISS_REQUEST_SECONDS = METRICS.histogram("moex_iss_request_seconds", "Latency of MOEX ISS requests", ("endpoint",))
+DB_ACQUIRE_SECONDS = METRICS.histogram("moex_db_pool_acquire_seconds", "Wait time of connection from DB pool")
+DB_QUERY_SECONDS = METRICS.histogram("moex_db_query_seconds", "Time of DB queries", ("method",))
+ROWS_INGESTED = METRICS.counter("moex_rows_ingested_total", "Rows written by bulk ingestion", ("table",))
+INGEST_SECONDS = METRICS.histogram("moex_ingest_seconds", "Time of bulk ingestion", ("table",))
+WAIT_LOG_POLLS = METRICS.counter("moex_wait_log_polls_total", "Polls of logs of history loaded by other requests")
+CODE_SECONDS = METRICS.histogram("moex_code_seconds", "Time of instrumented code blocks", ("name",))
+
+
+def timed(name: str) -> Timer:
+    """Decorator / context manager for any coroutine or block of code:
+        @timed("load_history")
+        async with timed("merge_success_history"):
+    For own histogram use: histogram.time(**labels)
+    """
+    return CODE_SECONDS.time(name=name)
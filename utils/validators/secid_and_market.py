@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 
 from db import MOEX_DB
 from api.securities_info.security_dict import api_get_and_save_security
+from utils.cache.dictionaries import DICTIONARY_CACHE
 
 
 Dictionaries = namedtuple("Dictionaries", ["table", "attribute"])
@@ -26,6 +27,8 @@ _SQL_TABLES = {
     "main_board": Dictionaries("handbook", "slug"),
 }
 
+DICTIONARY_CACHE.register(_SQL_TABLES.values())
+
 SQL_TEMPLATE = "SELECT 1 FROM %s WHERE %s = $1"
 
 
@@ -68,13 +71,15 @@ async def _check_dictionaries(
         value: Any,
         return_exception: bool = True,
 ):
-    async with MOEX_DB.pool.acquire() as connect:
-        result = await connect.fetchval(SQL_TEMPLATE % (table_name, attr_name), value)
-        if not result:
-            if return_exception:
-                raise HTTPException(status_code=404, detail=f"Not found value {table_name}.{attr_name}: {value}")
-            return False
-        return True
+    result = DICTIONARY_CACHE.check(table_name, attr_name, value)
+    if result is None:
+        async with MOEX_DB.pool.acquire() as connect:
+            result = await connect.fetchval(SQL_TEMPLATE % (table_name, attr_name), value)
+    if not result:
+        if return_exception:
+            raise HTTPException(status_code=404, detail=f"Not found value {table_name}.{attr_name}: {value}")
+        return False
+    return True
 
 
 async def _check_and_get_secid(security_id: str | None, security_attr: str | None):
@@ -1,5 +1,11 @@
-from workers.workers import process_workers
+from workers.workers import TaskModel, process_workers, submit_process_task
+from workers.history_sync import history_sync_scheduler
+from workers.securities_preload import securities_preload_scheduler
 
 __all__ = [
-    "process_workers"
+    "TaskModel",
+    "process_workers",
+    "submit_process_task",
+    "history_sync_scheduler",
+    "securities_preload_scheduler",
 ]
@@ -0,0 +1,190 @@
+"""
+FULL MARKET DAY HISTORY SYNC.
+Load all securities of market (all boards) by trading date, pages are requested concurrently.
+Days known as non-trading by TRADING_CALENDAR are not requested from ISS, unknown days (weekends too)
+are requested and empty response marks them as non-trading.
+Rows are saved in session_security_history and coverage is marked in logs_session_security_history,
+so user requests became DB reads. Sync is resumed from last saved date (sync_session_security_history).
+
+CLI: python -m workers.history_sync --engine stock --market shares --from 2023-01-01
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+
+from config import settings
+from db import MOEX_DB
+from api.history.trading_calendar import TRADING_CALENDAR
+from api.securities_info.summary import refresh_security_summary
+from moex_client import MOEX_CLIENT
+from sql_requests.log_session_history import (
+    raw_sql_extend_market_coverage,
+    raw_sql_get_market_sync_date,
+    raw_sql_insert_market_coverage,
+    raw_sql_set_market_sync_date,
+)
+from utils.database.bulk import bulk_upsert
+from utils.http.fast_json import parse_date
+from utils.validators.secid_and_market import Sessions
+
+HISTORY_TABLE = "session_security_history"
+HISTORY_COLUMNS = {
+    "BOARDID", "TRADEDATE", "SHORTNAME", "SECID", "NUMTRADES", "VALUE", "OPEN", "LOW", "HIGH",
+    "LEGALCLOSEPRICE", "WAPRICE", "CLOSE", "VOLUME", "MARKETPRICE2", "MARKETPRICE3", "ADMITTEDQUOTE",
+    "MP2VALTRD", "MARKETPRICE3TRADESVALUE", "ADMITTEDVALUE", "WAVAL", "TRADINGSESSION",
+}
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class MarketHistorySync:
+    __slots__ = ("engine", "market", "session", "url", "semaphore", "backfill_secids")
+
+    def __init__(self, engine: str, market: str, session: Sessions = Sessions.total):
+        self.engine = engine
+        self.market = market
+        self.session = session
+        self.url = settings.POINT_MARKET_DAY_HISTORY.format(engine=engine, market=market, session=int(session))
+        self.semaphore = asyncio.Semaphore(settings.HISTORY_SYNC_MAX_REQUESTS)
+        self.backfill_secids: set[str] = set()  # SUMMARY IS REFRESHED ONCE AFTER SYNC OF OLD DATES
+
+    @property
+    def key(self) -> tuple:
+        return self.engine, self.market, self.session
+
+    async def get_page(self, trade_date: str, start: int) -> dict:
+        async with self.semaphore:
+            return await MOEX_CLIENT.get_json(self.url, params={"date": trade_date, "start": start})
+
+    async def get_date(self, trade_date: date) -> tuple[list[str], list[list]]:
+        """All rows of market for date: first page gives cursor, other pages are requested concurrently"""
+        date_str = trade_date.strftime(DATE_FORMAT)
+        first_page = await self.get_page(date_str, 0)
+        columns, data = first_page["history"]["columns"], first_page["history"]["data"]
+        cursor_columns = first_page["history.cursor"]["columns"]
+        cursor = dict(zip(cursor_columns, first_page["history.cursor"]["data"][0]))
+        total, step = cursor["TOTAL"], cursor["PAGESIZE"]
+        pages = await asyncio.gather(*[self.get_page(date_str, start) for start in range(step, total, step)])
+        for page in pages:
+            data.extend(page["history"]["data"])
+        return columns, data
+
+    @staticmethod
+    def prepare_rows(columns: list[str], data: list[list]) -> tuple[list[str], list[list]]:
+        positions = [num for num, column in enumerate(columns) if column in HISTORY_COLUMNS]
+        date_position = columns.index("TRADEDATE")
+        for row in data:
+            row[date_position] = parse_date(row[date_position])
+        return [columns[num] for num in positions], [[row[num] for num in positions] for row in data]
+
+    async def save_date(self, trade_date: date, columns: list[str], data: list[list]):
+        """Rows, coverage, summary (for last 52 weeks) and sync date are saved in one transaction"""
+        secid_position = columns.index("SECID")
+        secids = {row[secid_position] for row in data}
+        recent = trade_date > datetime.now().date() - timedelta(days=365)
+        async with MOEX_DB.pool.acquire() as connection:
+            async with connection.transaction():
+                if data:
+                    await bulk_upsert(connection, HISTORY_TABLE, columns, data)
+                await connection.execute(raw_sql_extend_market_coverage, *self.key, trade_date)
+                await connection.execute(
+                    raw_sql_insert_market_coverage, *self.key, trade_date, [row[secid_position] for row in data]
+                )
+                await TRADING_CALENDAR.save_days(connection, self.engine, self.market, [trade_date], bool(data))
+                if recent:
+                    await refresh_security_summary(connection, secids)
+                await connection.execute(raw_sql_set_market_sync_date, *self.key, trade_date)
+        if not recent:
+            self.backfill_secids.update(secids)
+
+    async def skip_date(self, trade_date: date):
+        """Day known as non-trading: ISS is not requested, coverage (continuous intervals) and sync date go on"""
+        async with MOEX_DB.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(raw_sql_extend_market_coverage, *self.key, trade_date)
+                await connection.execute(raw_sql_set_market_sync_date, *self.key, trade_date)
+
+    async def refresh_backfill_summary(self):
+        secids = sorted(self.backfill_secids)
+        step = settings.MAX_SUMMARY_SECURITIES
+        async with MOEX_DB.pool.acquire() as connection:
+            for start in range(0, len(secids), step):
+                async with connection.transaction():
+                    await refresh_security_summary(connection, secids[start:start + step])
+        self.backfill_secids.clear()
+
+    async def last_date(self) -> date | None:
+        async with MOEX_DB.pool.acquire() as connection:
+            return await connection.fetchval(raw_sql_get_market_sync_date, *self.key)
+
+    async def run(self, start_date: date | None = None, end_date: date | None = None) -> int:
+        """Sync dates from start_date (or next after last synced) to end_date (yesterday by default)"""
+        end_date = end_date or datetime.now().date() - timedelta(days=1)
+        if start_date is None:
+            last_date = await self.last_date()
+            start_date = last_date + timedelta(days=1) if last_date else \
+                datetime.strptime(settings.HISTORY_SYNC_START_DATE, DATE_FORMAT).date()
+        rows = 0
+        trade_date = start_date
+        while trade_date <= end_date:
+            if TRADING_CALENDAR.is_non_trading(self.engine, self.market, trade_date):
+                await self.skip_date(trade_date)
+                trade_date += timedelta(days=1)
+                continue
+            columns, data = self.prepare_rows(*await self.get_date(trade_date))
+            await self.save_date(trade_date, columns, data)
+            rows += len(data)
+            logger.debug("History sync {}/{}: {} - {} rows", self.engine, self.market, trade_date, len(data))
+            trade_date += timedelta(days=1)
+        await self.refresh_backfill_summary()
+        logger.info("History sync {}/{} finished: {} - {}, {} rows", self.engine, self.market, start_date, end_date, rows)
+        return rows
+
+
+def sync_markets() -> list[tuple[str, str]]:
+    """engine/market from HISTORY_SYNC_MARKETS, wrong values are logged and skipped"""
+    markets = []
+    for value in settings.HISTORY_SYNC_MARKETS.split(","):
+        if not (value := value.strip()):
+            continue
+        engine, _, market = value.partition("/")
+        if not engine or not market or "/" in market:
+            logger.error("HISTORY_SYNC_MARKETS: wrong value '{}' (expected engine/market)", value)
+            continue
+        markets.append((engine, market))
+    return markets
+
+
+async def history_sync_scheduler():
+    """Background sync of all markets from settings (HISTORY_SYNC_MARKETS) every HISTORY_SYNC_INTERVAL seconds"""
+    while True:
+        for engine, market in sync_markets():
+            try:
+                await MarketHistorySync(engine, market).run()
+            except Exception as error:
+                logger.error("History sync {}/{} error: {}", engine, market, error)
+        await asyncio.sleep(settings.HISTORY_SYNC_INTERVAL)
+
+
+async def main(arguments: argparse.Namespace):
+    await MOEX_DB.create_pool()
+    await MOEX_CLIENT.create_session()
+    await TRADING_CALENDAR.load()
+    try:
+        await MarketHistorySync(arguments.engine, arguments.market, Sessions(arguments.session)).run(
+            arguments.start_date, arguments.end_date
+        )
+    finally:
+        await MOEX_CLIENT.close()
+        await MOEX_DB.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full market day history sync")
+    parser.add_argument("--engine", default="stock")
+    parser.add_argument("--market", default="shares")
+    parser.add_argument("--session", type=int, default=int(Sessions.total))
+    parser.add_argument("--from", dest="start_date", type=date.fromisoformat, default=None)
+    parser.add_argument("--till", dest="end_date", type=date.fromisoformat, default=None)
+    asyncio.run(main(parser.parse_args()))
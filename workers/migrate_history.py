@@ -0,0 +1,211 @@
+"""
+ONLINE MIGRATION OF session_security_history TO PARTITIONED LAYOUT (migrations/security_history.py).
+1. Create session_security_history_new (partitioned by year) and trigger on old table: new writes are mirrored.
+2. Copy old rows by batches of id (short transactions, pause between batches) - application keeps working.
+3. Counts of rows are compared in one snapshot (without lock, trigger mirrors writes), then tables
+   and their indexes are renamed in one short transaction (ACCESS EXCLUSIVE lock only for renames).
+Old table is kept as session_security_history_heap (--drop-old for drop).
+If migration is aborted, trigger and not complete new table are dropped (old table is untouched).
+With --benchmark read and write latency are measured on old and new tables before swap.
+
+CLI: python -m workers.migrate_history --batch-rows 50000 --pause 0.1 --benchmark
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, timedelta
+
+import asyncpg
+from loguru import logger
+
+from benchmarks.stats import summary
+from config import settings
+from migrations import security_history
+from utils.database.bulk import insert_template
+
+TABLE = "session_security_history"
+NEW_TABLE = "session_security_history_new"
+OLD_TABLE = "session_security_history_heap"
+COLUMNS = [
+    "boardid", "tradedate", "shortname", "secid", "numtrades", "value", "open", "low", "high",
+    "legalcloseprice", "waprice", "close", "volume", "marketprice2", "marketprice3", "admittedquote",
+    "mp2valtrd", "marketprice3tradesvalue", "admittedvalue", "waval", "tradingsession",
+]
+BENCH_SECID = "MIGRATION_BENCH"
+
+SQL_RELKIND = "SELECT relkind::text FROM pg_class WHERE oid = to_regclass($1)"
+SQL_ID_RANGE = "SELECT min(id), max(id) FROM %s" % TABLE
+SQL_COPY_BATCH = "INSERT INTO %s (%s) SELECT %s FROM %s WHERE id >= $1 AND id < $2 ON CONFLICT DO NOTHING" % (
+    NEW_TABLE, ", ".join(COLUMNS), ", ".join(COLUMNS), TABLE
+)
+SQL_COUNTS = "SELECT (SELECT count(*) FROM %s), (SELECT count(*) FROM %s)" % (TABLE, NEW_TABLE)
+SQL_INDEXES = "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = any($1::varchar[])"
+SQL_PARTITIONS = """
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = $1::regclass
+"""
+SQL_SYNC_TRIGGER = """
+CREATE OR REPLACE FUNCTION session_security_history_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM %(new)s WHERE secid = OLD.secid AND tradedate = OLD.tradedate AND boardid = OLD.boardid;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO %(new)s (%(columns)s) VALUES (%(values)s) ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS session_security_history_sync ON %(table)s;
+CREATE TRIGGER session_security_history_sync AFTER INSERT OR UPDATE OR DELETE ON %(table)s
+    FOR EACH ROW EXECUTE FUNCTION session_security_history_sync();
+""" % {
+    "new": NEW_TABLE,
+    "table": TABLE,
+    "columns": ", ".join(COLUMNS),
+    "values": ", ".join(f"NEW.{column}" for column in COLUMNS),
+}
+SQL_DROP_TRIGGER = f"""
+DROP TRIGGER IF EXISTS session_security_history_sync ON {TABLE};
+DROP FUNCTION IF EXISTS session_security_history_sync();
+"""
+SQL_SAMPLE_SECIDS = """
+    SELECT secid, min(tradedate) AS start_date, max(tradedate) AS end_date
+    FROM (SELECT secid, tradedate FROM %s TABLESAMPLE SYSTEM (1)) sample
+    GROUP BY secid
+    LIMIT $1
+"""
+SQL_BENCH_READ = "SELECT %s FROM %%s WHERE secid = $1 AND tradedate BETWEEN $2 AND $3" % ", ".join(COLUMNS)
+
+
+async def benchmark(connection: asyncpg.Connection, table: str, samples: int, write_rows: int) -> list[dict]:
+    """Read: day history of secid for random year. Write: batch of rows in transaction (rolled back)"""
+    secids = await connection.fetch(SQL_SAMPLE_SECIDS % table, samples)
+    reads = []
+    for _ in range(samples if secids else 0):
+        secid, start_date, end_date = random.choice(secids)
+        start_date = start_date + timedelta(days=random.randint(0, max((end_date - start_date).days - 365, 0)))
+        started = time.perf_counter()
+        await connection.fetch(SQL_BENCH_READ % table, secid, start_date, start_date + timedelta(days=365))
+        reads.append(time.perf_counter() - started)
+
+    first_day = date.today() - timedelta(days=write_rows)
+    rows = [
+        ["TQBR", first_day + timedelta(days=idx), BENCH_SECID, BENCH_SECID, 1, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0,
+         1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0, 3]
+        for idx in range(write_rows)
+    ]
+    writes = []
+    for _ in range(max(samples // 10, 1)):
+        transaction = connection.transaction()
+        await transaction.start()
+        try:
+            started = time.perf_counter()
+            await connection.executemany(insert_template(table, COLUMNS), rows)
+            writes.append(time.perf_counter() - started)
+        finally:
+            await transaction.rollback()
+    return [
+        summary("read_year_by_secid", reads, sum(reads), table=table),
+        summary("write_batch", writes, sum(writes), table=table, rows=write_rows),
+    ]
+
+
+async def create_new_table(connection: asyncpg.Connection):
+    ddl = security_history.session_security_history + security_history.session_security_history_partitions
+    await connection.execute(ddl.replace(TABLE, NEW_TABLE))
+    await connection.execute(SQL_SYNC_TRIGGER)
+
+
+async def copy_rows(connection: asyncpg.Connection, batch_rows: int, pause: float):
+    min_id, max_id = await connection.fetchrow(SQL_ID_RANGE)
+    if min_id is None:
+        return
+    started = time.perf_counter()
+    for batch_start in range(min_id, max_id + 1, batch_rows):
+        status = await connection.execute(SQL_COPY_BATCH, batch_start, batch_start + batch_rows)
+        logger.info("Migration of {}: id {} - {} ({})", TABLE, batch_start, batch_start + batch_rows - 1, status)
+        await asyncio.sleep(pause)
+    logger.info("Migration of {}: rows are copied in {:.1f}s", TABLE, time.perf_counter() - started)
+
+
+async def counts_are_equal(connection: asyncpg.Connection) -> bool:
+    """Both counts by one statement (one snapshot): rows mirrored by trigger are in both tables or in none"""
+    old_count, new_count = await connection.fetchrow(SQL_COUNTS)
+    if old_count != new_count:
+        logger.error("Migration of {}: rows {} != {}, tables are not swapped", TABLE, old_count, new_count)
+    return old_count == new_count
+
+
+async def swap_tables(connection: asyncpg.Connection):
+    """Under lock - only drop of trigger and renames (tables, partitions, indexes with primary keys)"""
+    partitions = [row["relname"] for row in await connection.fetch(SQL_PARTITIONS, NEW_TABLE)]
+    old_indexes = [row["indexname"] for row in await connection.fetch(SQL_INDEXES, [TABLE])]
+    new_indexes = [row["indexname"] for row in await connection.fetch(SQL_INDEXES, [NEW_TABLE, *partitions])]
+    async with connection.transaction():
+        await connection.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        await connection.execute(SQL_DROP_TRIGGER)
+        for index in old_indexes:
+            if index.startswith(TABLE):
+                await connection.execute(f"ALTER INDEX {index} RENAME TO {index.replace(TABLE, OLD_TABLE, 1)}")
+        await connection.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        await connection.execute(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}")
+        for partition in partitions:
+            await connection.execute(f"ALTER TABLE {partition} RENAME TO {partition.replace(NEW_TABLE, TABLE, 1)}")
+        for index in new_indexes:
+            if index.startswith(NEW_TABLE):
+                await connection.execute(f"ALTER INDEX {index} RENAME TO {index.replace(NEW_TABLE, TABLE, 1)}")
+
+
+async def abort_migration(connection: asyncpg.Connection):
+    """Without trigger new table is not synchronized any more: drop it, next run starts from scratch"""
+    await connection.execute(SQL_DROP_TRIGGER)
+    await connection.execute(f"DROP TABLE IF EXISTS {NEW_TABLE}")
+    logger.warning("Migration of {} is aborted: trigger and {} are dropped", TABLE, NEW_TABLE)
+
+
+async def main(arguments: argparse.Namespace):
+    connection = await asyncpg.connect(dsn=settings.DB_DSN)
+    try:
+        relkind = await connection.fetchval(SQL_RELKIND, TABLE)
+        if relkind != "r":
+            logger.info("Table {} is {}: migration is not needed", TABLE, "partitioned" if relkind else "absent")
+            return
+        results = []
+        if arguments.benchmark:
+            results.extend(await benchmark(connection, TABLE, arguments.samples, arguments.write_rows))
+
+        swapped = False
+        try:
+            await create_new_table(connection)
+            await copy_rows(connection, arguments.batch_rows, arguments.pause)
+            if arguments.benchmark:
+                results.extend(await benchmark(connection, NEW_TABLE, arguments.samples, arguments.write_rows))
+            if await counts_are_equal(connection):
+                await swap_tables(connection)
+                swapped = True
+        finally:
+            if not swapped:
+                await abort_migration(connection)
+        if not swapped:
+            return
+        logger.info("Migration of {}: tables are swapped, old table - {}", TABLE, OLD_TABLE)
+        if arguments.drop_old:
+            await connection.execute(f"DROP TABLE {OLD_TABLE}")
+        if arguments.output:
+            with open(arguments.output, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online migration of session_security_history to partitions")
+    parser.add_argument("--batch-rows", type=int, default=50_000, help="Rows (by id) in one copy transaction")
+    parser.add_argument("--pause", type=float, default=0.1, help="Pause between batches (seconds)")
+    parser.add_argument("--benchmark", action="store_true", help="Read/write latency of old and new tables")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--write-rows", type=int, default=1000)
+    parser.add_argument("--drop-old", action="store_true")
+    parser.add_argument("--output", help="File for JSON benchmark results")
+    asyncio.run(main(parser.parse_args()))
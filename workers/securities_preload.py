@@ -0,0 +1,86 @@
+"""
+PRELOAD OF ISS SECURITIES LISTING (securities.json) into security_description (search, validation of secid).
+Pages are requested by groups (SECURITIES_PRELOAD_PAGES concurrently), every group is saved by one statement.
+Only new securities are inserted as partial rows (COMPLETE = false): /security/{secid} and boards of security
+are still loaded from ISS (/securities/{secid}.json) on first request, partial row is completed then.
+
+CLI: python -m workers.securities_preload
+"""
+import argparse
+import asyncio
+
+from loguru import logger
+
+from config import settings
+from db import MOEX_DB
+from moex_client import MOEX_CLIENT
+from sql_requests.security_info import INSERT_SECURITIES_LIST
+
+PAGE_SIZE = 100
+DESCRIPTION_COLUMNS = ["secid", "name", "shortname", "isin", "regnumber", "type", "group", "emitent_id"]
+
+
+class SecuritiesPreload:
+    __slots__ = ("params",)
+
+    def __init__(self, only_traded: bool = settings.SECURITIES_PRELOAD_ONLY_TRADED):
+        self.params = {"is_trading": 1} if only_traded else {}
+
+    async def get_page(self, start: int) -> tuple[list[str], list[list]]:
+        result = await MOEX_CLIENT.get_json(settings.POINT_SECURITIES_LIST, params={**self.params, "start": start})
+        return result["securities"]["columns"], result["securities"]["data"]
+
+    @staticmethod
+    def prepare_rows(columns: list[str], data: list[list]) -> list[list]:
+        """Arrays (by columns) of descriptions for unnest"""
+        position = {column: num for num, column in enumerate(columns)}
+        return [
+            [None if row[position[column]] is None else str(row[position[column]]) for row in data]
+            for column in DESCRIPTION_COLUMNS
+        ]
+
+    async def save(self, columns: list[str], data: list[list]):
+        async with MOEX_DB.pool.acquire() as connection:
+            await connection.execute(INSERT_SECURITIES_LIST, *self.prepare_rows(columns, data))
+
+    async def run(self) -> int:
+        rows, start, step = 0, 0, settings.SECURITIES_PRELOAD_PAGES * PAGE_SIZE
+        while True:
+            pages = await asyncio.gather(*[self.get_page(page) for page in range(start, start + step, PAGE_SIZE)])
+            columns = pages[0][0]
+            data = [row for _, page_data in pages for row in page_data]
+            if data:
+                await self.save(columns, data)
+                rows += len(data)
+            logger.debug("Securities preload: {} - {}, {} rows", start, start + step, len(data))
+            if any(len(page_data) < PAGE_SIZE for _, page_data in pages):
+                break
+            start += step
+        logger.info("Securities preload finished: {} securities", rows)
+        return rows
+
+
+async def securities_preload_scheduler():
+    """Background preload of securities listing every SECURITIES_PRELOAD_INTERVAL seconds"""
+    while True:
+        try:
+            await SecuritiesPreload().run()
+        except Exception as error:
+            logger.error("Securities preload error: {}", error)
+        await asyncio.sleep(settings.SECURITIES_PRELOAD_INTERVAL)
+
+
+async def main(arguments: argparse.Namespace):
+    await MOEX_DB.create_pool()
+    await MOEX_CLIENT.create_session()
+    try:
+        await SecuritiesPreload(only_traded=not arguments.all).run()
+    finally:
+        await MOEX_CLIENT.close()
+        await MOEX_DB.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preload of ISS securities listing")
+    parser.add_argument("--all", action="store_true", help="Not only traded securities")
+    asyncio.run(main(parser.parse_args()))
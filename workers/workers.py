@@ -1,17 +1,25 @@
 """
 WORKERS FOR MULTIPROCESS CALCULATIONS.
-It's a bad pattern for high-loaded system because use additional resource for frequent creation of processes.
-Use this only in small project.
+Persistent ProcessPoolExecutor: every worker process creates one event loop and one DB pool in initializer
+and uses them for all tasks. Tasks are put in QUEUE_PROCESS (full queue - backpressure for producers),
+result or exception is returned to the caller by future.
 
 FIX FOR FUTURE: create calculation workers in new containers and use cache and queue. Redis, for example.
 """
 import asyncio
+import multiprocessing.util
+from typing import Any
 
+from asyncpg.pool import Pool
 from dataclasses import dataclass
-from db import pool_for_process
+from db import create_process_pool
 from config import QUEUE_PROCESS, settings
 from concurrent.futures import ProcessPoolExecutor
 from functools import partial
+from loguru import logger
+
+_worker_loop: asyncio.AbstractEventLoop | None = None
+_worker_pool: Pool | None = None
 
 
 @dataclass
@@ -21,30 +29,72 @@ class TaskModel:
     pool_attribute_name: str = "pool"
 
 
-async def run_task_with_db(task: TaskModel):
-    async with pool_for_process() as pool:
-        await task.task(**{task.pool_attribute_name: pool})
+def _close_worker():
+    if _worker_loop is None:
+        return
+    if _worker_pool is not None:
+        _worker_loop.run_until_complete(_worker_pool.close())
+    _worker_loop.close()
+
+
+def init_worker():
+    """Executor initializer: one loop and one DB pool for all tasks of process"""
+    global _worker_loop, _worker_pool
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+    _worker_pool = _worker_loop.run_until_complete(create_process_pool())
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
 
 
-def run_task_in_new_process(task: TaskModel):
+def run_task_in_worker(task: TaskModel) -> Any:
     if not asyncio.iscoroutinefunction(task.task):
         return task.task()
+    if task.need_db:
+        return _worker_loop.run_until_complete(task.task(**{task.pool_attribute_name: _worker_pool}))
+    return _worker_loop.run_until_complete(task.task())
+
+
+async def submit_process_task(task: TaskModel) -> Any:
+    """Run task in process pool and return result (or raise exception of task)"""
+    future = asyncio.get_running_loop().create_future()
+    await QUEUE_PROCESS.put((task, future))
+    return await future
+
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        if task.need_db:
-            loop.run_until_complete(run_task_with_db(task))
-        else:
-            loop.run_until_complete(task.task())
-    finally:
-        loop.close()
+def _set_result(future: asyncio.Future, executor_future: asyncio.Future):
+    if future.cancelled():
+        return
+    if executor_future.cancelled():
+        future.cancel()
+    elif (error := executor_future.exception()) is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(executor_future.result())
 
 
 async def process_workers():
+    """Dispatcher: get tasks from QUEUE_PROCESS and run them in pool. Cancel for graceful shutdown"""
     loop = asyncio.get_running_loop()
-    with ProcessPoolExecutor(max_workers=settings.MAX_PROCESS) as executor:
-        print("ProcessPool Running")
-        while True:
-            partial_task: TaskModel = await QUEUE_PROCESS.get()
-            loop.run_in_executor(executor, partial(run_task_in_new_process, partial_task))
+    in_flight = asyncio.Semaphore(settings.MAX_PROCESS * 2)
+    running: set[asyncio.Future] = set()
+    with ProcessPoolExecutor(max_workers=settings.MAX_PROCESS, initializer=init_worker) as executor:
+        logger.info("ProcessPool Running")
+        try:
+            while True:
+                await in_flight.acquire()
+                task, future = await QUEUE_PROCESS.get()
+                if future.cancelled():
+                    in_flight.release()
+                    continue
+                executor_future = loop.run_in_executor(executor, partial(run_task_in_worker, task))
+                running.add(executor_future)
+                executor_future.add_done_callback(running.discard)
+                executor_future.add_done_callback(lambda _: in_flight.release())
+                executor_future.add_done_callback(partial(_set_result, future))
+        finally:
+            while not QUEUE_PROCESS.empty():
+                _, future = QUEUE_PROCESS.get_nowait()
+                future.cancel()
+            if running:
+                await asyncio.wait(running)
+            logger.info("ProcessPool Stopped")